@@ -4,21 +4,31 @@ from flask_alembic import Alembic
 from flask_jwt_extended import JWTManager
 import sentry_sdk
 
-from app.core.logger import file_handler, Logger
+from app.core.logger import log_handler, Logger
 from app.core.config import CONFIG
+from app.core.json_provider import FastJSONProvider, orjson
+from app.core.query_tracking import QueryTracker
 from app.sql_models import db
 
 
-sentry_sdk.init(CONFIG.SENTRY_DSN)
+if CONFIG.SENTRY_DSN:
+    sentry_sdk.init(
+        CONFIG.SENTRY_DSN,
+        traces_sample_rate=CONFIG.SENTRY_TRACES_SAMPLE_RATE,
+        profiles_sample_rate=CONFIG.SENTRY_PROFILES_SAMPLE_RATE,
+    )
 
 
 app = Flask(__name__)
 app.config.from_object(CONFIG)
+if CONFIG.FAST_JSON and orjson:
+    app.json = FastJSONProvider(app)
 
-app.logger.addHandler(file_handler)
+app.logger.addHandler(log_handler)
 app.logger.setLevel(CONFIG.LOG_LEVEL)
 app.client_logger = Logger(app.logger, Logger.LoggerType.CLIENT)
 app.server_logger = Logger(app.logger, Logger.LoggerType.SERVER)
+QueryTracker(app.server_logger).install()
 
 db.init_app(app)
 ma = Marshmallow(app)
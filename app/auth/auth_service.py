@@ -1,27 +1,104 @@
+import atexit
 import json
-from typing import Optional
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import chain
+from typing import IO, Any, Iterable, Iterator, Optional, Union
 from uuid import uuid4
 from datetime import datetime, timedelta
 from flask_jwt_extended import create_access_token
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import (
+    DisconnectionError,
+    InterfaceError,
+    OperationalError,
+    SQLAlchemyError,
+)
 
 from app.api import app, db
-from app.sql_models import User
-from app.auth.exceptions import InvalidCredentials
+from app.sql_models import PasswordResetCode, User
+from app.auth import schemas
+from app.auth.exceptions import InvalidCredentials, VerificationUnavailable
+from app.auth.utils import password_verifier
 from app.core.exceptions import RecordNotFound
+from app.core.cache import create_cache
 from app.core.config import CONFIG
+from app.core.hashers import make_password
+from app.core.mailer import EmailBatcher, Message
+from app.core.timing import phase
+from app.utils import batched
 
-from tasks import send_email
+from tasks import send_email, send_emails, start_password_resets
+
+
+# Dialect specific INSERT constructs supporting `ON CONFLICT ... DO UPDATE`
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# Failures of the database rather than of the rows, an import stops on them
+DATABASE_ERRORS = (OperationalError, InterfaceError, DisconnectionError)
+
+# Serialized user profiles by customer_id, invalidated whenever a user is written
+user_cache = create_cache(
+    CONFIG.USER_CACHE_SIZE,
+    CONFIG.USER_CACHE_TTL,
+    redis_url=CONFIG.USER_CACHE_REDIS_URL,
+    prefix="user:",
+    logger=app.server_logger,
+    timeout=CONFIG.USER_CACHE_REDIS_TIMEOUT,
+)
+
+# Bursts of emails are enqueued as one `send_emails` task per batch
+email_batcher = EmailBatcher(
+    send_emails.delay,
+    CONFIG.EMAIL_BATCH_SIZE,
+    CONFIG.EMAIL_BATCH_WINDOW,
+    logger=app.server_logger,
+)
+atexit.register(email_batcher.flush)
+
+# With `FORGOT_PASSWORD_ASYNC`, bursts of resets are one `start_password_resets` task
+reset_batcher = EmailBatcher(
+    start_password_resets.delay,
+    CONFIG.EMAIL_BATCH_SIZE,
+    CONFIG.EMAIL_BATCH_WINDOW,
+    logger=app.server_logger,
+)
+atexit.register(reset_batcher.flush)
+
+
+def _hash_password(password: Any) -> Union[str, ValueError]:
+    """`make_password` for the import pool, returns the error of an invalid password."""
+    try:
+        return make_password(password)
+    except Exception as e:
+        return ValueError(f"Invalid password: {e}")
 
 
 class AuthService:
 
     def authenticate(self, email: str, password: str) -> User:
         """Authenticate a user by email and password"""
-        user = db.session.query(User).filter_by(email=email).first()
+        with phase("db"):
+            user = db.session.query(User).filter_by(email=email).first()
         if not user:
             raise InvalidCredentials
-        if not user.check_password(password):
-            raise InvalidCredentials
+        with phase("password"):
+            if not password_verifier.verify(user, password):
+                raise InvalidCredentials
+        if user.needs_rehash():
+            # Upgrade hashes made with an outdated cost now that the password is known,
+            # best effort: when the pool is busy it's done on a later login
+            try:
+                with phase("password"):
+                    password_verifier.rehash(user, password)
+            except VerificationUnavailable:
+                app.server_logger.info("Password rehash skipped, verification queue is full")
+                return user
+            with phase("db"):
+                db.session.commit()
         return user
 
     def generate_token(self, user: User) -> str:
@@ -34,71 +111,353 @@ class AuthService:
         user = db.session.query(User).filter_by(customer_id=customer_id).first()
         return user
 
-    def reset_password(self, email: str) -> bool:
-        """Initiates reset password process and sends email with verification code"""
-        user = db.session.query(User).filter_by(email=email).first()
-        if not user:
+    def get_user_profile(self, customer_id: str) -> Optional[dict]:
+        """Get a serialized user by customer_id if it exists, read through the user cache"""
+        profile = user_cache.get(customer_id)
+        if profile is None:
+            user = self.get_user(customer_id)
+            if not user:
+                return None
+            profile = schemas.serialize_user(user)
+            user_cache.set(customer_id, profile)
+        return profile
+
+    def reset_password(self, email: str, notify_async: bool = True) -> bool:
+        """Initiates reset password process and sends email with verification code
+
+        The code is stored hashed, by a single `INSERT ... SELECT` from the user with this
+        email that replaces any pending code. The email is sent by a Celery task, or right
+        away when not `notify_async`.
+        """
+        message = self._create_reset_code(email)
+        if message is None:
             return False
+        if not notify_async:
+            send_email(*message)
+            return True
+        with phase("enqueue"):
+            if CONFIG.EMAIL_BATCHING:
+                email_batcher.add(message)
+            else:
+                send_email.delay(*message)
+        return True
+
+    def reset_passwords(self, emails: Iterable[str]) -> int:
+        """`reset_password` for many emails, sent together by one `send_emails` task.
+
+        Runs in a worker. The emails are enqueued once the codes are committed, so the
+        task retries them while the SMTP server is down. Returns the number of emails.
+        """
+        messages = [message for message in map(self._create_reset_code, emails) if message]
+        if messages:
+            send_emails.delay(messages)
+        return len(messages)
+
+    def _create_reset_code(self, email: str) -> Optional[Message]:
+        """Store a new code for the user with this email, returns the email to send."""
         verification_code = str(uuid4())
-        app.server_logger.info(f"Verification code for {email}: {verification_code}")
-        user.verification_code = verification_code
-        user.verification_code_expiry = datetime.now() + timedelta(
-            minutes=CONFIG.VERIFICATION_CODE_EXPIRATION
-        )
-        db.session.commit()
-        send_email.delay(
+        with phase("db"):
+            created = db.session.execute(self._reset_code_statement(email, verification_code))
+            db.session.commit()
+        if not created.rowcount:
+            return None
+        return (
             email,
             "Password Reset",
             f"Use this verification code to reset your password: {verification_code}",
         )
-        return True
+
+    @staticmethod
+    def _reset_code_statement(email: str, verification_code: str):
+        """`INSERT ... SELECT ... ON CONFLICT (customer_id) DO UPDATE` of a user's reset code."""
+        expires_at = datetime.now() + timedelta(minutes=CONFIG.VERIFICATION_CODE_EXPIRATION)
+        insert = UPSERT_INSERTS[db.engine.dialect.name](PasswordResetCode.__table__)
+        stmt = insert.from_select(
+            ["customer_id", "code_hash", "expires_at"],
+            sa.select(
+                User.customer_id,
+                sa.literal(PasswordResetCode.hash_code(verification_code), sa.String),
+                sa.literal(expires_at, sa.DateTime),
+            ).where(User.email == email),
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=["customer_id"],
+            set_={"code_hash": stmt.excluded.code_hash, "expires_at": stmt.excluded.expires_at},
+        )
 
     def reset_password_confirm(
         self, email: str, password: str, verification_code: str
     ) -> bool:
-        """Confirm a user's password reset"""
-        user = db.session.query(User).filter_by(email=email).first()
-        if not user:
-            return False
-        if (
-            user.verification_code != verification_code
-            or user.verification_code_expiry < datetime.now()
-        ):
+        """Confirm a user's password reset
+
+        The code is checked and consumed by a single `DELETE ... RETURNING`, so it can only
+        be used once even by concurrent requests.
+        """
+        consume = (
+            sa.delete(PasswordResetCode)
+            .where(
+                PasswordResetCode.customer_id
+                == sa.select(User.customer_id).where(User.email == email).scalar_subquery(),
+                PasswordResetCode.code_hash == PasswordResetCode.hash_code(verification_code),
+                PasswordResetCode.expires_at > datetime.now(),
+            )
+            .returning(PasswordResetCode.customer_id)
+            .execution_options(synchronize_session=False)
+        )
+        with phase("db"):
+            customer_id = db.session.execute(consume).scalar()
+        if not customer_id:
+            db.session.rollback()
             return False
-        user.set_password(password)
-        user.verification_code = None
-        user.verification_code_expiry = None
-        db.session.commit()
+        with phase("password"):
+            hashed_password = make_password(password)
+        with phase("db"):
+            db.session.execute(
+                sa.update(User)
+                .where(User.customer_id == customer_id)
+                .values(hashed_password=hashed_password)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        user_cache.delete(customer_id)
         return True
 
-    def create_users(self, file: str) -> None:
-        """Create new users from JSONL file. Only called by the CLI."""
-        with app.app_context():
+    def purge_expired_reset_codes(self, batch_size: Optional[int] = None) -> int:
+        """Delete expired reset codes in batches of `batch_size`, returns how many were deleted.
+
+        Each batch is its own transaction, so locks are held briefly however many expired.
+        """
+        batch_size = batch_size or CONFIG.RESET_CODE_PURGE_BATCH_SIZE
+        purged = 0
+        while True:
+            expired = (
+                sa.select(PasswordResetCode.customer_id)
+                .where(PasswordResetCode.expires_at <= datetime.now())
+                .limit(batch_size)
+            )
+            deleted = db.session.execute(
+                sa.delete(PasswordResetCode)
+                .where(PasswordResetCode.customer_id.in_(expired))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            purged += deleted
+            if deleted < batch_size:
+                return purged
+
+    def create_users(
+        self,
+        file: str,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        restart: bool = False,
+    ) -> None:
+        """Create or update users from JSONL file, streaming it in batches. Only called by the CLI.
+
+        Plaintext `password` fields are hashed across `workers` processes while the
+        previous batch is written to the database. Users are upserted by customer_id
+        and the byte offset of each committed batch is saved to `<file>.checkpoint`,
+        so an interrupted import resumes where it stopped. Rows that cannot be
+        parsed or written are appended to `<file>.rejects` instead of failing the import.
+        """
+        batch_size = batch_size or CONFIG.IMPORT_BATCH_SIZE
+        workers = workers or CONFIG.IMPORT_HASH_WORKERS or os.cpu_count() or 1
+        checkpoint_path, rejects_path = f"{file}.checkpoint", f"{file}.rejects"
+        offset = 0 if restart else self._read_checkpoint(checkpoint_path)
+        if offset:
+            print(f"Resuming import from byte {offset}.")
+        with ExitStack() as stack, app.app_context(), open(rejects_path, "a") as rejects:
+            created = rejected = 0
+            start = time.perf_counter()
+            executor = None
             try:
-                with open(file, "r") as f:
-                    users = [json.loads(line) for line in f]
-                    for user in users:
-                        if (
-                            "language" not in user
-                            or user["language"] not in User.VALID_LANGUAGES
-                        ):
-                            user["language"] = "en"
-                        new_user = User(**user)
-                        db.session.add(new_user)
-                    db.session.commit()
+                rows = self._read_users(file, offset, rejects)
+                batches = batched(rows, batch_size)
+                first = next(batches, [])
+                # Start the pool before any database connection exists, so none are forked,
+                # and only for exports with passwords. Later ones are hashed in process.
+                if workers > 1 and any("password" in user for _, user in first):
+                    executor = stack.enter_context(ProcessPoolExecutor(workers))
+                batches = chain([first], batches) if first else batches
+                chunksize = max(1, batch_size // (workers * 4))
+                hashed = self._hash_passwords(batches, executor, rejects, chunksize)
+                for end, users, unhashable in hashed:
+                    failed = self._upsert_users(users, rejects) if users else 0
+                    offset = end
+                    self._write_checkpoint(checkpoint_path, offset)
+                    created += len(users) - failed
+                    rejected += unhashable + failed
+                    rate = (created + rejected) / (time.perf_counter() - start)
+                    print(
+                        f"{created} users created, {rejected} rejected ({rate:.0f} rows/sec)"
+                    )
+                if os.path.exists(checkpoint_path):
+                    os.remove(checkpoint_path)
                 print("Users created successfully.")
             except Exception as e:
-                print(f"Error creating users: {e}")
+                db.session.rollback()
+                print(f"Error creating users after byte {offset}, re-run to resume: {e}")
+        if os.path.getsize(rejects_path):
+            print(f"Rejected rows written to {rejects_path}.")
+        else:
+            os.remove(rejects_path)
 
-    def update_user(self, customer_id: str, update: dict) -> User:
-        """Update user record with new data"""
-        user = db.session.query(User).filter_by(customer_id=customer_id).first()
-        if not user:
+    @staticmethod
+    def _read_checkpoint(path: str) -> int:
+        """Byte offset after the last committed import batch, 0 without checkpoint."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r") as f:
+            return int(f.read().strip() or 0)
+
+    @staticmethod
+    def _write_checkpoint(path: str, offset: int) -> None:
+        """Atomically replace the import checkpoint."""
+        with open(f"{path}.tmp", "w") as f:
+            f.write(str(offset))
+        os.replace(f"{path}.tmp", path)
+
+    @staticmethod
+    def _reject(rejects: IO[str], row: Any, error: Exception) -> None:
+        """Record a row that could not be imported along with the reason."""
+        rejects.write(json.dumps({"row": row, "error": str(error)}) + "\n")
+
+    def _upsert_users(self, users: list, rejects: IO[str]) -> int:
+        """Upsert a batch of users in one transaction, returns the number rejected.
+
+        If the batch fails, rows are retried one by one so only offending rows are rejected.
+        Errors of the database itself, like a lost connection, are raised instead so the
+        import stops before the checkpoint moves past the batch.
+        """
+        try:
+            for keys, rows in self._group_by_keys(users).items():
+                db.session.execute(self._upsert_statement(keys), rows)
+            db.session.commit()
+            return 0
+        except DATABASE_ERRORS:
+            db.session.rollback()
+            raise
+        except SQLAlchemyError:
+            db.session.rollback()
+
+        rejected = 0
+        for user in users:
+            try:
+                db.session.execute(self._upsert_statement(tuple(sorted(user))), [user])
+                db.session.commit()
+            except DATABASE_ERRORS:
+                db.session.rollback()
+                raise
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                self._reject(rejects, user, getattr(e, "orig", None) or e)
+                rejected += 1
+        return rejected
+
+    @staticmethod
+    def _group_by_keys(users: list) -> dict:
+        """Group rows by their set of keys, an executemany needs identical parameters."""
+        groups = {}
+        for user in users:
+            groups.setdefault(tuple(sorted(user)), []).append(user)
+        return groups
+
+    @staticmethod
+    def _upsert_statement(keys: tuple):
+        """`INSERT ... ON CONFLICT (customer_id) DO UPDATE` of the given columns."""
+        stmt = UPSERT_INSERTS[db.engine.dialect.name](User.__table__)
+        columns = [key for key in keys if key in stmt.excluded and key != "customer_id"]
+        update = {key: stmt.excluded[key] for key in columns}
+        if not update:
+            return stmt.on_conflict_do_nothing(index_elements=["customer_id"])
+        return stmt.on_conflict_do_update(index_elements=["customer_id"], set_=update)
+
+    @staticmethod
+    def _hash_passwords(
+        batches: Iterable[list],
+        executor: Optional[Executor],
+        rejects: IO[str],
+        chunksize: int = 1,
+    ) -> Iterator[tuple[int, list, int]]:
+        """Replace plaintext passwords with hashes, one batch ahead of the consumer.
+
+        Yields (offset after the batch, users, number of rows rejected). Rows whose
+        password can't be hashed, e.g. it isn't a string, are rejected.
+        """
+        pending = None
+        for batch in batches:
+            users = [user for _, user in batch if "password" in user]
+            passwords = [user.pop("password") for user in users]
+            if executor:
+                hashes = executor.map(_hash_password, passwords, chunksize=chunksize)
+            else:
+                hashes = map(_hash_password, passwords)
+            if pending:
+                yield AuthService._fill_hashes(*pending, rejects)
+            pending = (batch, users, hashes)
+        if pending:
+            yield AuthService._fill_hashes(*pending, rejects)
+
+    @staticmethod
+    def _fill_hashes(
+        batch: list, users: list, hashes: Iterable, rejects: IO[str]
+    ) -> tuple[int, list, int]:
+        """Wait for a batch's hashes and store them on its users."""
+        unhashable = set()
+        for user, hashed_password in zip(users, hashes):
+            if isinstance(hashed_password, ValueError):
+                AuthService._reject(rejects, user, hashed_password)
+                unhashable.add(id(user))
+            else:
+                user["hashed_password"] = hashed_password
+        valid = [user for _, user in batch if id(user) not in unhashable]
+        return batch[-1][0], valid, len(unhashable)
+
+    @staticmethod
+    def _read_users(
+        file: str, offset: int, rejects: IO[str]
+    ) -> Iterator[tuple[int, dict]]:
+        """Lazily read users from JSONL file starting at a byte offset.
+
+        Yields (offset after the line, user), defaulting missing or invalid languages.
+        """
+        with open(file, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    user = json.loads(line)
+                    if not isinstance(user, dict):
+                        raise ValueError("Expected a JSON object")
+                except ValueError as e:
+                    AuthService._reject(rejects, line.decode("utf-8", "replace"), e)
+                    continue
+                if "language" not in user or user["language"] not in User.VALID_LANGUAGES:
+                    user["language"] = "en"
+                yield offset, user
+
+    def update_user(self, customer_id: str, update: dict) -> dict:
+        """Update user record with new data, returns the serialized user.
+
+        Runs a single `UPDATE ... RETURNING` instead of loading the user first.
+        """
+        stmt = (
+            sa.update(User)
+            .where(User.customer_id == customer_id)
+            .values(**User.validate_values(update))
+            .returning(User.customer_id, User.email, User.country, User.language)
+            .execution_options(synchronize_session=False)
+        )
+        row = db.session.execute(stmt).mappings().first()
+        if not row:
+            db.session.rollback()
             raise RecordNotFound
-        for key, value in update.items():
-            setattr(user, key, value)
         db.session.commit()
-        return user
+        profile = dict(row)
+        user_cache.set(customer_id, profile)
+        return profile
 
 
 auth_service = AuthService()
@@ -5,3 +5,9 @@ class InvalidCredentials(Exception):
     """Raised when the credentials are invalid"""
 
     pass
+
+
+class VerificationUnavailable(Exception):
+    """Raised when too many password verifications are already in progress"""
+
+    pass
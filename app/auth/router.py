@@ -1,11 +1,14 @@
 from flask import Blueprint, request
 from marshmallow import ValidationError
 from app.auth import schemas
-from app.auth.auth_service import auth_service
-from app.auth.exceptions import InvalidCredentials
+from app.auth.auth_service import auth_service, reset_batcher
+from app.auth.exceptions import InvalidCredentials, VerificationUnavailable
 from app.core.exceptions import RecordNotFound
-from app.auth.utils import authenticate
+from app.auth.utils import authenticate, get_customer_id
+from app.core.config import CONFIG
+from app.core.timing import phase
 from app.api import app
+from tasks import start_password_reset
 
 
 auth_router = Blueprint("auth", __name__, url_prefix="/auth")
@@ -14,40 +17,58 @@ auth_router = Blueprint("auth", __name__, url_prefix="/auth")
 @auth_router.route("/login", methods=["POST"])
 def login():
     try:
-        login_request = schemas.LoginRequest().load(request.json)
+        with phase("validate"):
+            login_request = schemas.login_request.load(request.json)
         user = auth_service.authenticate(
             login_request["email"], login_request["password"]
         )
-        jwt = auth_service.generate_token(user)
-        return schemas.UserResponse().dump({"data": {"user": user, "jwt": jwt}})
+        with phase("token"):
+            jwt = auth_service.generate_token(user)
+        with phase("serialize"):
+            return schemas.dump_user_response(user, jwt)
     except ValidationError as e:
         app.client_logger.warning(e.messages)
-        return schemas.UserResponse().dump({"errors": e.messages}), 400
+        return schemas.user_response.dump({"errors": e.messages}), 400
     except InvalidCredentials:
         app.client_logger.warning("Invalid email or password")
-        return schemas.UserResponse().dump({"error": "Invalid email or password."}), 401
+        return schemas.user_response.dump({"error": "Invalid email or password."}), 401
+    except VerificationUnavailable:
+        app.server_logger.warning("Password verification queue is full")
+        return (
+            schemas.user_response.dump({"error": "Too many login attempts, retry later."}),
+            503,
+            {"Retry-After": str(CONFIG.PASSWORD_VERIFY_RETRY_AFTER)},
+        )
 
 
 @auth_router.route("/forgot_password", methods=["POST"])
 def forgot_password():
     try:
-        forgot_password_request = schemas.ForgotPasswordRequest().load(request.json)
-        auth_service.reset_password(forgot_password_request["email"])
-        return schemas.BaseResponse().dump(
+        forgot_password_request = schemas.forgot_password_request.load(request.json)
+        if CONFIG.FORGOT_PASSWORD_ASYNC:
+            # Same work and response whether the account exists or not
+            with phase("enqueue"):
+                if CONFIG.EMAIL_BATCHING:
+                    reset_batcher.add(forgot_password_request["email"])
+                else:
+                    start_password_reset.delay(forgot_password_request["email"])
+        else:
+            auth_service.reset_password(forgot_password_request["email"])
+        return schemas.base_response.dump(
             {
                 "message": "If you have an account, you will receive an email with instructions to reset your password."
             }
         )
     except ValidationError as e:
         app.client_logger.warning(e.messages)
-        return schemas.BaseResponse().dump({"errors": e.messages}), 400
+        return schemas.base_response.dump({"errors": e.messages}), 400
 
 
 # Reset password POST request with email, password, and verification_code as JSON body in ResetPasswordRequest schema
 @auth_router.route("/reset_password", methods=["POST"])
 def reset_password():
     try:
-        reset_password_request = schemas.ResetPasswordRequest().load(request.json)
+        reset_password_request = schemas.reset_password_request.load(request.json)
         done = auth_service.reset_password_confirm(
             reset_password_request["email"],
             reset_password_request["password"],
@@ -55,15 +76,15 @@ def reset_password():
         )
         if not done:
             return (
-                schemas.BaseResponse().dump(
+                schemas.base_response.dump(
                     {"error": "Invalid email, password, or verification code."}
                 ),
                 400,
             )
-        return schemas.BaseResponse().dump({"message": "Password reset."})
+        return schemas.base_response.dump({"message": "Password reset."})
     except ValidationError as e:
         app.client_logger.warning(e.messages)
-        return schemas.BaseResponse().dump({"errors": e.messages}), 400
+        return schemas.base_response.dump({"errors": e.messages}), 400
 
 
 # Get current user GET request with JWT token in Authorization header
@@ -71,25 +92,25 @@ def reset_password():
 @authenticate()
 def get_current_user():
     try:
-        customer_id = request.environ.get("customer_id")
-        user = auth_service.get_user(customer_id)
-        return schemas.UserResponse().dump({"data": {"user": user}})
+        customer_id = get_customer_id(request)
+        user = auth_service.get_user_profile(customer_id)
+        return schemas.dump_user_response(user)
     except RecordNotFound:
         app.client_logger.warning("User not found")
-        return schemas.UserResponse().dump({"error": "User not found."}), 404
+        return schemas.user_response.dump({"error": "User not found."}), 404
 
 
 @auth_router.route("/user", methods=["PATCH"])
 @authenticate()
 def update_user():
     try:
-        update = schemas.UpdateUserRequest().load(request.json)
-        customer_id = request.environ.get("customer_id")
+        update = schemas.update_user_request.load(request.json)
+        customer_id = get_customer_id(request)
         user = auth_service.update_user(customer_id, update)
-        return schemas.UserResponse().dump({"data": {"user": user}})
+        return schemas.dump_user_response(user)
     except ValidationError as e:
         app.client_logger.warning(e.messages)
-        return schemas.UserResponse().dump({"errors": e.messages}), 400
+        return schemas.user_response.dump({"errors": e.messages}), 400
     except RecordNotFound:
         app.client_logger.warning("User not found")
-        return schemas.UserResponse().dump({"error": "User not found."}), 404
+        return schemas.user_response.dump({"error": "User not found."}), 404
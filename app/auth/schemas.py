@@ -1,5 +1,10 @@
+from operator import attrgetter
+from typing import Optional
+
 from marshmallow import Schema, fields
+from app.core.config import CONFIG
 from app.core.schemas import BaseResponse
+from app.core.validation import request_validator
 from app.sql_models import User
 from app.api import ma
 
@@ -43,3 +48,34 @@ class UpdateUserRequest(Schema):
             "validator_failed": f"Invalid language. Valid languages: {User.VALID_LANGUAGES}"
         },
     )
+
+
+# Schemas hold no per-request state, reuse one instance of each
+_compiled = CONFIG.COMPILED_REQUEST_VALIDATION
+forgot_password_request = request_validator(ForgotPasswordRequest(), _compiled)
+reset_password_request = request_validator(ResetPasswordRequest(), _compiled)
+login_request = request_validator(LoginRequest(), _compiled)
+update_user_request = request_validator(UpdateUserRequest(), _compiled)
+user_response = UserResponse()
+base_response = BaseResponse()
+
+
+_user_fields = UserSchema.Meta.fields
+_get_user_fields = attrgetter(*_user_fields)
+
+
+def serialize_user(user) -> Optional[dict]:
+    """Fast equivalent of `UserSchema().dump(user)` for a User or an already serialized user."""
+    if user is None:
+        return None
+    if isinstance(user, dict):
+        return {field: user[field] for field in _user_fields}
+    return dict(zip(_user_fields, _get_user_fields(user)))
+
+
+def dump_user_response(user, jwt: Optional[str] = None) -> dict:
+    """Fast equivalent of `user_response.dump({"data": {"user": user, "jwt": jwt}})`."""
+    data = {"user": serialize_user(user)}
+    if jwt is not None:
+        data["jwt"] = jwt
+    return {"data": data}
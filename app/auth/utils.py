@@ -1,22 +1,46 @@
+import hashlib
 import jwt
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from typing import Optional
 from app.api import app
+from app.auth.exceptions import VerificationUnavailable
+from app.core.cache import LRUCache
 from app.core.config import CONFIG
+from app.core.hashers import make_password
+from app.sql_models import User
 from flask import request
 
 
+# Claims of verified tokens keyed by token digest, so tokens aren't held in memory
+token_cache = LRUCache(CONFIG.JWT_CACHE_SIZE)
+
+
+def decode_token(token: str) -> dict:
+    """Verify a JWT and return its claims, reusing the claims of recently verified tokens."""
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    claims = token_cache.get(key)
+    if claims is None:
+        claims = jwt.decode(
+            token,
+            CONFIG.JWT_SECRET_KEY,
+            algorithms=[CONFIG.JWT_ALGORITHM],
+            verify=True,
+        )
+        # Cached claims are only served until the token expires
+        token_cache.set(key, claims, expires_at=claims.get("exp"))
+    return claims
+
+
 def check_authenticated(request) -> bool:
     """Checks if request is authenticated, if yes, set the customer ID for the request."""
+    request.environ["is_authenticated"] = False
     token = request.environ.get("HTTP_AUTHORIZATION", "").split("Bearer ")[-1]
     if not token:
         return None
     try:
-        token = jwt.decode(
-            token,
-            CONFIG.JWT_SECRET_KEY,
-            algorithms=[CONFIG.JWT_ALGORITHM],
-            verify=True,
-        )
+        token = decode_token(token)
         customer_id = token.get("sub")
         request.environ["customer_id"] = customer_id
         request.environ["is_authenticated"] = True
@@ -25,13 +49,27 @@ def check_authenticated(request) -> bool:
         return False
 
 
+def is_authenticated(request) -> bool:
+    """Checks if request is authenticated, the token is only decoded on the first call."""
+    if "is_authenticated" not in request.environ:
+        check_authenticated(request)
+    return request.environ["is_authenticated"]
+
+
+def get_customer_id(request) -> Optional[str]:
+    """Customer ID of an authenticated request, None otherwise."""
+    if not is_authenticated(request):
+        return None
+    return request.environ.get("customer_id")
+
+
 def authenticate():
     """Decorator to check if request is authenticated."""
 
     def wrapper(fn):
         @wraps(fn)
         def decorator(*args, **kwargs):
-            if request.environ.get("is_authenticated"):
+            if is_authenticated(request):
                 return fn(*args, **kwargs)
 
             app.client_logger.warning("Unauthorized request.")
@@ -40,3 +78,40 @@ def authenticate():
         return decorator
 
     return wrapper
+
+
+class PasswordVerifier:
+    """Verifies passwords on a bounded thread pool.
+
+    At most `workers` verifications run at once and `queue_depth` more may wait for a
+    thread. Beyond that `VerificationUnavailable` is raised right away, so a login burst
+    is shed instead of piling up behind bcrypt.
+    """
+
+    def __init__(self, workers: int, queue_depth: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-verifier"
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+
+    def verify(self, user: User, password: str) -> bool:
+        """Check the user's password, blocks until a worker thread has verified it."""
+        return self._run(user.check_password, password)
+
+    def rehash(self, user: User, password: str) -> None:
+        """Hash the password again with the configured cost. Does not commit to the database."""
+        user.hashed_password = self._run(make_password, password)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise VerificationUnavailable
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+
+password_verifier = PasswordVerifier(
+    CONFIG.PASSWORD_VERIFY_WORKERS, CONFIG.PASSWORD_VERIFY_QUEUE_DEPTH
+)
+
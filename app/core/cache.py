@@ -0,0 +1,159 @@
+"""In-process caches."""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Union
+
+import redis
+
+
+class LRUCache:
+    """Thread-safe least recently used cache with per-entry expiry.
+
+    Keeps at most `maxsize` entries. Entries expire at `expires_at` (epoch seconds)
+    when given, otherwise `ttl` seconds after being set, or never without a `ttl`.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get an unexpired value, marking it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.time() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit and miss counters since the cache was created or cleared."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+
+class RedisCache:
+    """Cache shared between processes, values are stored as JSON under `prefix`.
+
+    Same interface as `LRUCache`, hit and miss counters are per process. Redis errors
+    are logged and counted, a failed `get` is a miss and a failed `set` or `delete` does
+    nothing, so the cache being down never fails a request. Entries that couldn't be
+    deleted expire after `ttl`.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        prefix: str,
+        ttl: Optional[float] = None,
+        logger: Optional[Any] = None,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.logger = logger or logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _error(self, operation: str, key: str, error: redis.RedisError) -> None:
+        self.errors += 1
+        self.logger.warning(f"Cache {operation} of {self.prefix}{key} failed: {error}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = self.client.get(self.prefix + key)
+        except redis.RedisError as e:
+            self._error("get", key, e)
+            value = None
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, expires_at: Optional[float] = None) -> None:
+        ttl = expires_at - time.time() if expires_at is not None else self.ttl
+        try:
+            self.client.set(
+                self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl else None
+            )
+        except redis.RedisError as e:
+            self._error("set", key, e)
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except redis.RedisError as e:
+            self._error("delete", key, e)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+        self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "errors": self.errors,
+        }
+
+
+def create_cache(
+    maxsize: int,
+    ttl: Optional[float],
+    redis_url: Optional[str] = None,
+    prefix: str = "",
+    logger: Optional[Any] = None,
+    timeout: float = 0.1,
+) -> Union[LRUCache, RedisCache]:
+    """Redis backed cache when `redis_url` is set, in-process LRU cache otherwise.
+
+    Redis calls give up after `timeout` seconds, so an unreachable server costs a
+    request at most that long per call rather than the TCP timeout.
+    """
+    if redis_url:
+        client = redis.Redis.from_url(
+            redis_url, socket_connect_timeout=timeout, socket_timeout=timeout
+        )
+        return RedisCache(client, prefix, ttl=ttl, logger=logger)
+    return LRUCache(maxsize, ttl=ttl)
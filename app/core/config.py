@@ -16,15 +16,68 @@ class Config:
         "file_template": " %%(year)d_%%(month).2d_%%(day).2d_%%(hour).2d%%(minute).2d-%%(rev)s_%%(slug)s",
     }
     LOG_FILE = "app.log"  # Default log file
+    LOG_FORMAT = "text"  # text or json, one object per line
+    # None, "external" (logrotate), or in-process by "size" or "time", gzipped in the background.
+    # In-process rotation is only safe when one process writes LOG_FILE.
+    LOG_ROTATION = None
+    LOG_MAX_BYTES = 100 * 1024 * 1024  # Size at which "size" rotation starts a new file
+    LOG_ROTATION_WHEN = "midnight"  # Interval of "time" rotation, see TimedRotatingFileHandler
+    LOG_BACKUP_COUNT = 14  # Rotated files kept
+    LOG_SAMPLE_RATES = {}  # Fraction of records kept per level, e.g. {logging.INFO: 0.01}
+    LOG_ASYNC = False  # Format and write logs on a background thread
+    LOG_QUEUE_SIZE = 10_000  # Records waiting for the background thread, newer ones are dropped
     VERIFICATION_CODE_EXPIRATION = 60 * 60  # 1 hour
+    FORGOT_PASSWORD_ASYNC = False  # Look up the user and send the code in a Celery task
+    RESET_CODE_PURGE_INTERVAL = 15 * 60  # Seconds between runs of the expired codes purge
+    RESET_CODE_PURGE_BATCH_SIZE = 1000  # Expired codes deleted per transaction
+    SMTP_HOST = os.getenv("SMTP_HOST")  # Emails are printed when unset
+    SMTP_PORT = int(os.getenv("SMTP_PORT", 25))
+    SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+    SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+    SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "false").lower() == "true"
+    EMAIL_SENDER = os.getenv("EMAIL_SENDER", "noreply@localhost")
+    EMAIL_BATCHING = False  # Coalesce emails into one `send_emails` task per batch
+    EMAIL_BATCH_SIZE = 100  # Emails per batch, a full batch is sent right away
+    EMAIL_BATCH_WINDOW = 0.5  # Seconds the first email of a batch waits for others
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_ALGORITHM = "HS256"
     JWT_ERROR_MESSAGE_KEY = "error"
+    JWT_CACHE_SIZE = 10_000  # Verified tokens kept in memory until they expire
     CLIENT_MAJOR_VERSION, CLIENT_MINOR_VERSION, CLIENT_PATCH_VERSION = 2, 1, 0
     CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
-    SENTRY_DSN = os.getenv("SENTRY_DSN")
+    SENTRY_DSN = os.getenv("SENTRY_DSN")  # Sentry is only initialized when set
+    SENTRY_TRACES_SAMPLE_RATE = float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", 0))  # Of requests
+    SENTRY_PROFILES_SAMPLE_RATE = float(os.getenv("SENTRY_PROFILES_SAMPLE_RATE", 0))  # Of traces
     LOG_LEVEL = logging.WARNING
+    FAST_JSON = True  # Parse and encode JSON with orjson when it's installed
+    COMPILED_REQUEST_VALIDATION = True  # Load request bodies with compiled validators
+    USER_CACHE_SIZE = 10_000  # Profiles kept by the in-process cache of `GET /auth/user`
+    USER_CACHE_TTL = 5 * 60  # Seconds
+    USER_CACHE_REDIS_URL = os.getenv("USER_CACHE_REDIS_URL")  # Share the cache between workers
+    USER_CACHE_REDIS_TIMEOUT = 0.1  # Seconds to connect to or hear from Redis before skipping it
+    IMPORT_BATCH_SIZE = 5000  # Rows inserted and committed per batch by `create-users`
+    IMPORT_HASH_WORKERS = None  # Password hashing processes for `create-users`, None uses all cores
+    PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "bcrypt")  # bcrypt, scrypt or pbkdf2_sha256
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))  # Pick with `cli.py calibrate-bcrypt`
+    SCRYPT_N, SCRYPT_R, SCRYPT_P = 2**14, 8, 1  # Uses 128 * N * R bytes (16MB) per hash
+    PBKDF2_ITERATIONS = 600_000
+    # Per gunicorn worker, sized for `--threads 16`: logins hold at most 12 request threads
+    PASSWORD_VERIFY_WORKERS = 4  # Threads verifying passwords on login, bcrypt releases the GIL
+    PASSWORD_VERIFY_QUEUE_DEPTH = 8  # Logins allowed to wait for a thread before answering 503
+    PASSWORD_VERIFY_RETRY_AFTER = 1  # Seconds, `Retry-After` header value of the 503 response
+    METRICS_ENABLED = True  # Record request metrics and serve them on `/metrics`
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # Bearer token of scrapers, else localhost only
+    METRICS_DIR = os.getenv("METRICS_DIR")  # Shared by gunicorn workers, empty it on deploy
+    METRICS_FLUSH_INTERVAL = 5  # Seconds between writes of a worker's metrics to METRICS_DIR
+    SERVER_TIMING = False  # Send the duration of request phases in a `Server-Timing` header
+    SLOW_QUERY_THRESHOLD_MS = 100  # SQL statements taking longer are logged
+    DEFAULT_QUERY_BUDGET = 5  # Queries a request may run before a warning is logged
+    QUERY_BUDGETS = {"/auth/user": 2}  # Budgets by route, overriding DEFAULT_QUERY_BUDGET
+    PROFILER_ENABLED = False  # Allow profiling requests, never in production
+    PROFILER_HEADER = "X-Profile"  # Requests sending this header are profiled
+    PROFILER_SAMPLE_RATE = 0.0  # Fraction of all requests profiled
+    PROFILER_DIR = "profiles"  # `<request_id>.prof` files are written here
 
 
 class TestingConfig(Config):
@@ -34,6 +87,7 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_TEST_DATABASE_URI")
     LOG_FILE = "test.log"
     LOG_LEVEL = logging.INFO
+    BCRYPT_ROUNDS = 4  # Minimum cost, keeps the test suite fast
 
 
 class DevelopmentConfig(Config):
@@ -43,13 +97,20 @@ class DevelopmentConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DEV_DATABASE_URI")
     LOG_FILE = "dev.log"
     LOG_LEVEL = logging.DEBUG
+    SERVER_TIMING = True
 
 
 class ProductionConfig(Config):
     """Production configuration"""
 
     LOG_FILE = "prod.log"
-    LOG_LEVEL = logging.ERROR
+    # Request lines are INFO, `analyze-logs` needs them. 1% of requests and every warning are kept
+    LOG_LEVEL = logging.INFO
+    LOG_SAMPLE_RATES = {logging.INFO: 0.01}
+    LOG_ASYNC = True
+    LOG_ROTATION = "external"  # Written by every gunicorn worker and Celery child
+    FORGOT_PASSWORD_ASYNC = True
+    EMAIL_BATCHING = True
     SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_PROD_DATABASE_URI")
 
 
@@ -0,0 +1,173 @@
+"""Password hashers.
+
+Hashes are self-describing: each stored hash names its algorithm and parameters, so a
+hash can always be verified no matter which hasher is configured today.
+
+- bcrypt: `$2b$<rounds>$<salt and hash>`
+- scrypt: `scrypt$<n>$<r>$<p>$<salt>$<hash>`
+- pbkdf2_sha256: `pbkdf2_sha256$<iterations>$<salt>$<hash>`
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import time
+import bcrypt
+
+from app.core.config import CONFIG
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+class PasswordHasher:
+    """Base class, subclasses implement one hashing algorithm."""
+
+    algorithm: str = None
+
+    def hash(self, password: str) -> str:
+        """Hash the password with a fresh salt."""
+        raise NotImplementedError
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """Check the password against a hash made by this algorithm."""
+        raise NotImplementedError
+
+    def needs_update(self, encoded: str) -> bool:
+        """Check if a hash made by this algorithm used different parameters."""
+        raise NotImplementedError
+
+
+class BcryptHasher(PasswordHasher):
+    algorithm = "bcrypt"
+
+    def __init__(self, rounds: int = 12):
+        self.rounds = rounds
+
+    def hash(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+    def verify(self, password: str, encoded: str) -> bool:
+        return bcrypt.checkpw(password.encode("utf-8"), encoded.encode("utf-8"))
+
+    def needs_update(self, encoded: str) -> bool:
+        return int(encoded.split("$")[2]) != self.rounds
+
+
+def calibrate_bcrypt_rounds(target_ms: float, samples: int = 3) -> list[tuple[int, float]]:
+    """Measure bcrypt hash time on this machine for increasing costs.
+
+    Returns (rounds, median milliseconds) pairs up to the first cost slower than `target_ms`.
+    """
+    timings = []
+    for rounds in range(4, 32):
+        salt = bcrypt.gensalt(rounds=rounds)
+        durations = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"calibration password", salt)
+            durations.append((time.perf_counter() - start) * 1000)
+        timings.append((rounds, sorted(durations)[samples // 2]))
+        if timings[-1][1] > target_ms:
+            break
+    return timings
+
+
+class ScryptHasher(PasswordHasher):
+    algorithm = "scrypt"
+
+    def __init__(self, n: int = 2**14, r: int = 8, p: int = 1):
+        self.n, self.r, self.p = n, r, p
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        # scrypt needs 128 * n * r bytes, leave headroom over OpenSSL's 32MB default
+        maxmem = 2 * 128 * n * r * p
+        return hashlib.scrypt(
+            password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=32
+        )
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(16)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+        return f"{self.algorithm}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, n, r, p, salt, key = encoded.split("$")
+        derived = self._derive(password, _b64decode(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(derived, _b64decode(key))
+
+    def needs_update(self, encoded: str) -> bool:
+        _, n, r, p, _, _ = encoded.split("$")
+        return (int(n), int(r), int(p)) != (self.n, self.r, self.p)
+
+
+class PBKDF2Hasher(PasswordHasher):
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations: int = 600_000):
+        self.iterations = iterations
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, iterations: int) -> bytes:
+        return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(16)
+        key = self._derive(password, salt, self.iterations)
+        return f"{self.algorithm}${self.iterations}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, iterations, salt, key = encoded.split("$")
+        derived = self._derive(password, _b64decode(salt), int(iterations))
+        return hmac.compare_digest(derived, _b64decode(key))
+
+    def needs_update(self, encoded: str) -> bool:
+        return int(encoded.split("$")[1]) != self.iterations
+
+
+def get_hasher(algorithm: str = None) -> PasswordHasher:
+    """Build a hasher for the algorithm with its configured parameters, defaults to PASSWORD_HASHER."""
+    algorithm = algorithm or CONFIG.PASSWORD_HASHER
+    if algorithm == BcryptHasher.algorithm:
+        return BcryptHasher(rounds=CONFIG.BCRYPT_ROUNDS)
+    if algorithm == ScryptHasher.algorithm:
+        return ScryptHasher(n=CONFIG.SCRYPT_N, r=CONFIG.SCRYPT_R, p=CONFIG.SCRYPT_P)
+    if algorithm == PBKDF2Hasher.algorithm:
+        return PBKDF2Hasher(iterations=CONFIG.PBKDF2_ITERATIONS)
+    raise ValueError(f"Unknown password hasher: {algorithm}")
+
+
+def identify_hasher(encoded: str) -> PasswordHasher:
+    """Get a hasher able to verify the given hash."""
+    if encoded.startswith("$2"):
+        return get_hasher(BcryptHasher.algorithm)
+    return get_hasher(encoded.split("$", 1)[0])
+
+
+def make_password(password: str) -> str:
+    """Hash a password with the configured hasher.
+
+    Kept at module level so it can be pickled and run in worker processes.
+    """
+    return get_hasher().hash(password)
+
+
+def check_password(password: str, encoded: str) -> bool:
+    """Check a password against a hash made by any supported hasher."""
+    return identify_hasher(encoded).verify(password, encoded)
+
+
+def needs_rehash(encoded: str) -> bool:
+    """Check if a hash was made by another hasher or with other parameters than configured."""
+    hasher = get_hasher()
+    return identify_hasher(encoded).algorithm != hasher.algorithm or hasher.needs_update(
+        encoded
+    )
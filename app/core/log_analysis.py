@@ -0,0 +1,130 @@
+"""Streaming analysis of the request logs written by `RequestFormatter`.
+
+Files are read a line at a time, memory-mapped (or decompressed on the fly for rotated
+`.gz` segments), and only aggregates are kept, so multi-gigabyte logs are analyzed in
+constant memory. `pre_request_hook` and `post_request_hook` lines are paired by
+`request_id` to measure latency.
+"""
+
+import gzip
+import json
+import mmap
+import re
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+
+LINE = re.compile(
+    rb"^\[(?P<time>[^\]]*)\]\[[^\]]*\]\[(?P<request_id>[^\]]*)\]\[(?P<customer_id>[^\]]*)\]"
+    rb"\[[^\]]*\]\[[^\]]*\]\[\d+\]\[[A-Z]+\]\[(?P<log_type>[^\]]*)\]: (?P<message>.*?)\r?$"
+)
+# Messages of the request hooks: "GET /auth/user" and "GET /auth/user 200"
+REQUEST_START = re.compile(r"^[A-Z]+ (?P<path>\S+)$")
+REQUEST_END = re.compile(r"^[A-Z]+ (?P<path>\S+) (?P<status>\d{3})$")
+
+# Requests still waiting for their end line, the oldest are forgotten beyond this
+MAX_PENDING = 100_000
+
+
+def read_lines(path: str) -> Iterator[bytes]:
+    """Yield the lines of a log file without loading it into memory."""
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            yield from f
+        return
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files can't be mapped
+            return
+        with mapped:
+            yield from iter(mapped.readline, b"")
+
+
+def parse_line(line: bytes) -> Optional[tuple[str, str, str, str, str]]:
+    """Parse a text or JSON log line into (time, request_id, customer_id, log_type, message)."""
+    if line.startswith(b"{"):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        return (
+            entry.get("time"),
+            str(entry.get("request_id")),
+            str(entry.get("customer_id")),
+            entry.get("log_type"),
+            entry.get("message"),
+        )
+    match = LINE.match(line)
+    if not match:
+        return None
+    return tuple(
+        value.decode("utf-8", "replace")
+        for value in match.group("time", "request_id", "customer_id", "log_type", "message")
+    )
+
+
+def parse_time(value: str) -> datetime:
+    # asctime looks like "2024-05-02 22:53:59,923"
+    return datetime.fromisoformat(value.replace(",", "."))
+
+
+def percentile(histogram: Counter, fraction: float) -> int:
+    """Percentile of a histogram of integer values."""
+    rank = fraction * sum(histogram.values())
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+    return 0
+
+
+class LogReport:
+    """Aggregates request counts, statuses, latencies and customers over log lines."""
+
+    def __init__(self):
+        self.requests = Counter()  # By path
+        self.statuses = Counter()
+        self.latencies = defaultdict(Counter)  # Milliseconds histogram by path
+        self.customers = Counter()
+        self.unpaired = 0  # End lines without a start line
+        self._pending = {}  # Start time by request_id
+
+    def add(self, lines: Iterable[bytes]) -> "LogReport":
+        for line in lines:
+            parsed = parse_line(line)
+            if not parsed or parsed[3] != "server":
+                continue
+            time, request_id, customer_id, _, message = parsed
+            end = REQUEST_END.match(message)
+            if end:
+                self._add_end(time, request_id, customer_id, end["path"], end["status"])
+            elif REQUEST_START.match(message):
+                self._pending[request_id] = time
+                if len(self._pending) > MAX_PENDING:
+                    del self._pending[next(iter(self._pending))]
+        return self
+
+    def _add_end(self, time, request_id, customer_id, path, status) -> None:
+        self.requests[path] += 1
+        self.statuses[status] += 1
+        if customer_id not in ("None", "", None):
+            self.customers[customer_id] += 1
+        start = self._pending.pop(request_id, None)
+        if start is None:
+            self.unpaired += 1
+            return
+        latency = parse_time(time) - parse_time(start)
+        self.latencies[path][round(latency.total_seconds() * 1000)] += 1
+
+    def latency_summary(self, path: str) -> dict:
+        """Latency percentiles of a path, in milliseconds."""
+        histogram = self.latencies[path]
+        return {
+            "p50": percentile(histogram, 0.5),
+            "p90": percentile(histogram, 0.9),
+            "p99": percentile(histogram, 0.99),
+            "max": max(histogram, default=0),
+        }
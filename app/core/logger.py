@@ -1,39 +1,235 @@
 """Logger module for the application."""
 
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import random
+import shutil
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from typing import Optional
 from flask import has_request_context, request
 import logging
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+    WatchedFileHandler,
+)
 from app.core.config import CONFIG
 
 
+def add_request_context(record: logging.LogRecord) -> None:
+    """Set the request fields used by the log format on the record, once."""
+    if hasattr(record, "request_id"):
+        return
+
+    if has_request_context():
+        record.path = request.path
+        record.remote_addr = request.remote_addr
+        record.request_id = request.environ.get("request_id")
+        record.customer_id = request.environ.get("customer_id")
+    else:
+        record.path = None
+        record.remote_addr = None
+        record.request_id = None
+        record.customer_id = None
+
+    if not hasattr(record, "log_type"):
+        record.log_type = ""
+
+
 class RequestFormatter(logging.Formatter):
     def format(self, record):
-        if has_request_context():
-            record.path = request.path
-            record.remote_addr = request.remote_addr
-            record.request_id = request.environ.get("request_id")
-            record.customer_id = request.environ.get("customer_id")
-        else:
-            record.path = None
-            record.remote_addr = None
-            record.request_id = None
-            record.customer_id = None
-
-        if not hasattr(record, "log_type"):
-            record.log_type = ""
-
+        add_request_context(record)
         return super().format(record)
 
 
+class JSONRequestFormatter(RequestFormatter):
+    """Formats records as one JSON object per line, with the fields of the text format."""
+
+    def format(self, record):
+        add_request_context(record)
+        entry = {
+            "time": self.formatTime(record),
+            "remote_addr": record.remote_addr,
+            "request_id": record.request_id,
+            "customer_id": record.customer_id,
+            "path": record.path,
+            "filename": record.filename,
+            "lineno": record.lineno,
+            "level": record.levelname,
+            "log_type": record.log_type,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LogSampler:
+    """Decides whether to keep a record from its level's sample rate, before it's created.
+
+    Levels missing from `rates` are always kept. All records of a request share one
+    decision, so a request's start and end lines are kept or dropped together.
+    """
+
+    def __init__(self, rates: dict[int, float]):
+        self.rates = rates
+
+    def keep(self, level: int) -> bool:
+        rate = self.rates.get(level, 1.0)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        request_id = has_request_context() and request.environ.get("request_id")
+        if request_id:
+            return zlib.crc32(request_id.encode("utf-8")) < rate * 2**32
+        return random.random() < rate
+
+
+class RequestQueueHandler(QueueHandler):
+    """Hands records to a `QueueListener` thread, which formats and writes them.
+
+    The logging thread only captures the request fields, since the listener has no
+    request context. When the bounded queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, queue: queue.Queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        add_request_context(record)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Single thread, so rotated segments are compressed one at a time off the logging thread
+compression_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-compressor")
+
+
+class CompressedRotationMixin:
+    """Gzips rotated log segments on a background thread and keeps the newest `retention`.
+
+    Rotation is done by the process that notices the file is due, so only one process
+    may write the file. Several gunicorn workers or Celery children each rotating the
+    same file would keep writing to segments the others renamed and deleted.
+    """
+
+    def __init__(self, *args, retention: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retention = retention
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._rotate
+        self._pending = None
+
+    def _rotate(self, source: str, dest: str) -> None:
+        # Only rename here, so the log file is reopened right away
+        segment = dest[: -len(".gz")]
+        os.rename(source, segment)
+        self._pending = compression_executor.submit(self._compress, segment, dest)
+
+    def _compress(self, segment: str, dest: str) -> None:
+        try:
+            with open(segment, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(segment)
+        except BaseException:
+            # Keep the segment uncompressed rather than a truncated archive
+            if os.path.exists(dest):
+                os.remove(dest)
+            raise
+        finally:
+            # Segments a failure left uncompressed count towards retention too
+            pattern = f"{glob.escape(self.baseFilename)}.*"
+            segments = sorted(glob.glob(pattern), key=os.path.getmtime)
+            for expired in segments[: -self.retention]:
+                os.remove(expired)
+
+    def _wait_for_compression(self) -> None:
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        try:
+            pending.result()
+        except Exception as e:
+            # Like `Handler.handleError`, logging from inside the handler could recurse
+            print(f"Compressing a rotated log segment failed: {e!r}", file=sys.stderr)
+
+    def doRollover(self):
+        # Rollover renames existing segments, the previous one must be compressed first
+        self._wait_for_compression()
+        super().doRollover()
+
+    def close(self):
+        super().close()
+        self._wait_for_compression()
+
+
+class CompressingRotatingFileHandler(CompressedRotationMixin, RotatingFileHandler):
+    """Rotates the log file by size."""
+
+
+class CompressingTimedRotatingFileHandler(CompressedRotationMixin, TimedRotatingFileHandler):
+    """Rotates the log file at timed intervals."""
+
+
+def create_file_handler(config) -> logging.FileHandler:
+    """File handler for the configured LOG_ROTATION: None, "external", "size" or "time"."""
+    if config.LOG_ROTATION == "external":
+        # Reopens the file after logrotate moved it, safe with any number of processes
+        return WatchedFileHandler(config.LOG_FILE)
+    if config.LOG_ROTATION == "size":
+        return CompressingRotatingFileHandler(
+            config.LOG_FILE,
+            maxBytes=config.LOG_MAX_BYTES,
+            backupCount=config.LOG_BACKUP_COUNT,
+            retention=config.LOG_BACKUP_COUNT,
+        )
+    if config.LOG_ROTATION == "time":
+        # Retention is applied after compression, the handler's own cleanup is disabled
+        return CompressingTimedRotatingFileHandler(
+            config.LOG_FILE, when=config.LOG_ROTATION_WHEN, retention=config.LOG_BACKUP_COUNT
+        )
+    return logging.FileHandler(config.LOG_FILE)
+
+
 formatter = RequestFormatter(
     "[%(asctime)s][%(remote_addr)s][%(request_id)s][%(customer_id)s][%(path)s][%(filename)s][%(lineno)d][%(levelname)s][%(log_type)s]: %(message)s"
 )
+if CONFIG.LOG_FORMAT == "json":
+    formatter = JSONRequestFormatter()
+
+log_sampler = LogSampler(CONFIG.LOG_SAMPLE_RATES)
 
 
 log_file = CONFIG.LOG_FILE
-file_handler = logging.FileHandler(log_file)
+file_handler = create_file_handler(CONFIG)
 file_handler.setFormatter(formatter)
 
+# Handler to attach to loggers, writes on a background thread in async mode
+log_handler = file_handler
+if CONFIG.LOG_ASYNC:
+    log_handler = RequestQueueHandler(queue.Queue(maxsize=CONFIG.LOG_QUEUE_SIZE))
+    log_listener = QueueListener(
+        log_handler.queue, file_handler, respect_handler_level=True
+    )
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
 
 class Logger:
 
@@ -41,27 +237,39 @@ class Logger:
         CLIENT = "client"
         SERVER = "server"
 
-    def __init__(self, logger: logging.Logger, log_type: LoggerType):
+    def __init__(
+        self,
+        logger: logging.Logger,
+        log_type: LoggerType,
+        sampler: Optional[LogSampler] = None,
+    ):
         self.logger = logger
         self.log_type = log_type.value
+        self.sampler = sampler or log_sampler
+
+    def _should_log(self, level: int) -> bool:
+        """Sampling is decided here, so dropped messages never become records."""
+        return self.logger.isEnabledFor(level) and self.sampler.keep(level)
 
     def info(self, message: str):
-        self.logger.info(message, extra={"log_type": self.log_type})
+        self.log(logging.INFO, message)
 
     def error(self, message: any):
-        self.logger.error(message, extra={"log_type": self.log_type})
+        self.log(logging.ERROR, message)
 
     def exception(self, exception: any):
-        self.logger.exception(exception, extra={"log_type": self.log_type})
+        if self._should_log(logging.ERROR):
+            self.logger.exception(exception, extra={"log_type": self.log_type})
 
     def warning(self, message: str):
-        self.logger.warning(message, extra={"log_type": self.log_type})
+        self.log(logging.WARNING, message)
 
     def debug(self, message: str):
-        self.logger.debug(message, extra={"log_type": self.log_type})
+        self.log(logging.DEBUG, message)
 
     def critical(self, message: str):
-        self.logger.critical(message, extra={"log_type": self.log_type})
+        self.log(logging.CRITICAL, message)
 
     def log(self, level: int, message: any):
-        self.logger.log(level, message, extra={"log_type": self.log_type})
+        if self._should_log(level):
+            self.logger.log(level, message, extra={"log_type": self.log_type})
@@ -0,0 +1,160 @@
+"""Email delivery.
+
+`SMTPMailer` keeps one SMTP connection per process and reuses it across messages and
+tasks, reconnecting when the server closed it. Without `SMTP_HOST` messages are printed.
+`EmailBatcher` coalesces the messages a process produces into batches, so a burst of
+emails becomes one Celery task and one SMTP session.
+"""
+
+import logging
+import smtplib
+import threading
+from email.message import EmailMessage
+from typing import Any, Callable, Iterable, Optional
+
+from app.core.config import CONFIG
+
+
+# (recipient, subject, body)
+Message = tuple[str, str, str]
+
+
+class SMTPMailer:
+    """Sends messages over a persistent, lazily opened SMTP connection."""
+
+    def __init__(
+        self,
+        host: Optional[str],
+        port: int = 25,
+        sender: str = "noreply@localhost",
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: bool = False,
+        timeout: float = 10,
+    ):
+        self.host, self.port, self.sender = host, port, sender
+        self.username, self.password = username, password
+        self.use_tls, self.timeout = use_tls, timeout
+        self._connection = None
+        self._lock = threading.Lock()  # smtplib connections aren't thread-safe
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def _send(self, message: EmailMessage) -> None:
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                self._connection.send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                # Servers close idle connections, retry once on a new one
+                self._connection = None
+                if attempt:
+                    raise
+
+    def send(self, messages: Iterable[Message]) -> list[str]:
+        """Send the messages, returns the recipients they couldn't be delivered to.
+
+        A message the server rejects doesn't stop the others. Errors reaching the server
+        are raised.
+        """
+        if not self.host:
+            for email, subject, body in messages:
+                print(f"Email sent to {email} with subject: {subject} and body: {body}")
+            return []
+        failed = []
+        with self._lock:
+            for email, subject, body in messages:
+                message = EmailMessage()
+                message["From"], message["To"], message["Subject"] = self.sender, email, subject
+                message.set_content(body)
+                try:
+                    self._send(message)
+                except smtplib.SMTPException:
+                    failed.append(email)
+        return failed
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                try:
+                    self._connection.quit()
+                except smtplib.SMTPException:
+                    pass
+                self._connection = None
+
+
+class EmailBatcher:
+    """Collects messages and hands them to `send_batch` by `max_size` or after `window` seconds.
+
+    The window starts with the first message of a batch, so no message waits longer than
+    `window`. Call `flush` before exiting to send what's pending. When `send_batch` fails,
+    e.g. the broker is down, the batch is lost: the failure is logged as an error and
+    counted in `failures`.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[list], Any],
+        max_size: int,
+        window: float,
+        logger: Optional[Any] = None,
+    ):
+        self.send_batch = send_batch
+        self.max_size = max_size
+        self.window = window
+        self.logger = logger or logging.getLogger(__name__)
+        self.failures = 0
+        self._pending = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, message: Message) -> None:
+        with self._lock:
+            self._pending.append(message)
+            if len(self._pending) < self.max_size:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            batch = self._take()
+        self._send(batch)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch: list) -> None:
+        # Runs on the timer thread too, where an exception would drop the batch unnoticed
+        try:
+            self.send_batch(batch)
+        except Exception as error:
+            self.failures += 1
+            self.logger.error(f"Sending a batch of {len(batch)} failed, it was lost: {error}")
+
+    def _take(self) -> list:
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+
+mailer = SMTPMailer(
+    CONFIG.SMTP_HOST,
+    CONFIG.SMTP_PORT,
+    sender=CONFIG.EMAIL_SENDER,
+    username=CONFIG.SMTP_USERNAME,
+    password=CONFIG.SMTP_PASSWORD,
+    use_tls=CONFIG.SMTP_USE_TLS,
+)
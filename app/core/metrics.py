@@ -0,0 +1,186 @@
+"""Runtime metrics exposed in the Prometheus text format.
+
+Each process records into its own `MetricsRegistry`. With `directory` set (gunicorn
+runs several workers), every worker periodically writes a snapshot to
+`<directory>/<pid>.json` and a scrape, served by any worker, adds up the snapshots
+of all workers. Counters and histograms of exited workers are kept so totals never
+go backwards, their gauges are dropped. Empty the directory when deploying.
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Callable, Iterable, Optional
+
+from app.core.config import CONFIG
+
+
+# Seconds, same defaults as the official Prometheus clients
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# Collectors are called on each scrape and yield (type, name, labels, value)
+Collector = Callable[[], Iterable[tuple[str, str, dict, float]]]
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms of the current process, identified by name and labels."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS, directory: Optional[str] = None):
+        self.buckets = buckets
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = defaultdict(float)
+        # Per bucket counts, the last one is +Inf, followed by the sum of observations
+        self._histograms = defaultdict(lambda: [0] * (len(self.buckets) + 1) + [0.0])
+        self._collectors = []
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def add(self, name: str, value: float, **labels) -> None:
+        """Add to a gauge, `value` may be negative."""
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms[key]
+            histogram[bucket] += 1
+            histogram[-1] += value
+
+    def register_collector(self, collector: Collector) -> None:
+        """Add a callable reporting values owned elsewhere, e.g. cache counters."""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        """JSON serializable copy of this process' metrics."""
+        counters, gauges = defaultdict(float), defaultdict(float)
+        for collector in self._collectors:
+            for kind, name, labels, value in collector():
+                (counters if kind == "counter" else gauges)[_key(name, labels)] += value
+        with self._lock:
+            for key, value in self._counters.items():
+                counters[key] += value
+            for key, value in self._gauges.items():
+                gauges[key] += value
+            histograms = [[*key, list(value)] for key, value in self._histograms.items()]
+        return {
+            "counters": [[*key, value] for key, value in counters.items()],
+            "gauges": [[*key, value] for key, value in gauges.items()],
+            "histograms": histograms,
+        }
+
+    def flush(self) -> None:
+        """Write this process' snapshot for the other workers, atomically."""
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def start_flushing(self, interval: float) -> None:
+        """Flush every `interval` seconds on a daemon thread, and once more at exit."""
+        os.makedirs(self.directory, exist_ok=True)
+
+        def loop():
+            while not stopped.wait(interval):
+                self.flush()
+
+        stopped = threading.Event()
+        threading.Thread(target=loop, name="metrics-flusher", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _other_snapshots(self) -> Iterable[dict]:
+        for file in os.listdir(self.directory):
+            pid, extension = os.path.splitext(file)
+            if extension != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(self.directory, file)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):  # Exited or mid-write
+                continue
+            if not _is_alive(int(pid)):
+                snapshot["gauges"] = []
+            yield snapshot
+
+    def render(self) -> str:
+        """All workers' metrics in the Prometheus text exposition format."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            snapshots.extend(self._other_snapshots())
+
+        counters, gauges = defaultdict(float), defaultdict(float)
+        histograms = defaultdict(lambda: [0] * (len(self.buckets) + 2))
+        for snapshot in snapshots:
+            for name, labels, value in snapshot["counters"]:
+                counters[name, _labels(labels)] += value
+            for name, labels, value in snapshot["gauges"]:
+                gauges[name, _labels(labels)] += value
+            for name, labels, values in snapshot["histograms"]:
+                merged = histograms[name, _labels(labels)]
+                for i, value in enumerate(values):
+                    merged[i] += value
+
+        lines = []
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in series}):
+                lines.append(f"# TYPE {name} {kind}")
+                for (series_name, labels), value in sorted(series.items()):
+                    if series_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (series_name, labels), values in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), values):
+                    cumulative += count
+                    le = (("le", f"{bound:g}" if bound != "+Inf" else bound),)
+                    lines.append(f"{name}_bucket{_format_labels(labels + le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]:g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels) -> tuple:
+    """Labels as a hashable tuple, JSON turns the tuples of a snapshot into lists."""
+    return tuple(tuple(label) for label in labels)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+metrics = MetricsRegistry(directory=CONFIG.METRICS_DIR)
+if CONFIG.METRICS_ENABLED and CONFIG.METRICS_DIR:
+    metrics.start_flushing(CONFIG.METRICS_FLUSH_INTERVAL)
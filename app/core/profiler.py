@@ -0,0 +1,53 @@
+"""Opt-in request profiling.
+
+With `PROFILER_ENABLED`, requests sending the `PROFILER_HEADER` header, plus a random
+`PROFILER_SAMPLE_RATE` fraction of all requests, run under `cProfile`. Each profile
+is written to `<PROFILER_DIR>/<request_id>.prof` and can be opened with `pstats`,
+snakeviz, or aggregated with `cli.py profile-report`.
+"""
+
+import cProfile
+import glob
+import io
+import os
+import pstats
+import random
+from typing import Optional
+
+from app.core.config import CONFIG
+
+
+def start_profiling(request) -> Optional[cProfile.Profile]:
+    """Start profiling the request if it was asked for or sampled, return the profiler."""
+    if not CONFIG.PROFILER_ENABLED:
+        return None
+    header = request.headers.get(CONFIG.PROFILER_HEADER)
+    if not header and random.random() >= CONFIG.PROFILER_SAMPLE_RATE:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # Another profiler is already active in this thread
+        return None
+    return profiler
+
+
+def stop_profiling(profiler: cProfile.Profile, request_id: str) -> str:
+    """Stop the profiler and write its stats, return the file path."""
+    profiler.disable()
+    os.makedirs(CONFIG.PROFILER_DIR, exist_ok=True)
+    path = os.path.join(CONFIG.PROFILER_DIR, f"{request_id}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+def profile_report(directory: str, sort: str = "cumulative", top: int = 20) -> str:
+    """Top functions across all the profiles of a directory."""
+    paths = sorted(glob.glob(os.path.join(directory, "*.prof")))
+    if not paths:
+        return f"No profiles in {directory}."
+    output = io.StringIO()
+    stats = pstats.Stats(*paths, stream=output)
+    output.write(f"{len(paths)} profiles\n")
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return output.getvalue()
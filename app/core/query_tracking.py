@@ -0,0 +1,46 @@
+"""Per-request SQL query accounting.
+
+Engine events count the statements run during a request and add up their time in
+`g.query_count` and `g.query_time`, and log statements slower than
+`SLOW_QUERY_THRESHOLD_MS`. Log lines carry the `request_id` like every other line.
+Statements run outside a request, e.g. by the CLI, aren't tracked.
+"""
+
+import time
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import CONFIG
+
+
+# Characters of a slow statement that are logged
+MAX_STATEMENT_LENGTH = 500
+
+
+class QueryTracker:
+    """Listens to the cursor events of every engine."""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def install(self) -> None:
+        event.listen(Engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # The execution context lives as long as the statement, even when it fails
+        context.query_start = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # CLI commands like `create-users` run long bulk statements on purpose
+        if not has_request_context():
+            return
+        elapsed = time.perf_counter() - context.query_start
+        g.query_count = g.get("query_count", 0) + 1
+        g.query_time = g.get("query_time", 0.0) + elapsed
+        if elapsed * 1000 >= CONFIG.SLOW_QUERY_THRESHOLD_MS:
+            if len(statement) > MAX_STATEMENT_LENGTH:
+                statement = f"{statement[:MAX_STATEMENT_LENGTH]}..."
+            self.logger.warning(f"Slow query ({elapsed * 1000:.1f}ms): {statement}")
@@ -0,0 +1,42 @@
+"""Timing of the phases of a request, e.g. password verification or the DB query.
+
+Durations feed the `request_phase_duration_seconds` histogram and, inside a request, are
+added up in `g.phases` for the `Server-Timing` response header. When Sentry tracing is
+configured each phase is also a span of the request's transaction.
+"""
+
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Iterator
+
+import sentry_sdk
+from flask import g, has_request_context
+
+from app.core.config import CONFIG
+from app.core.metrics import metrics
+
+
+# Spans are only opened when transactions can be sampled
+SENTRY_TRACING = bool(CONFIG.SENTRY_DSN and CONFIG.SENTRY_TRACES_SAMPLE_RATE)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time the block as the phase `name`, a phase entered several times is added up."""
+    span = sentry_sdk.start_span(op=name) if SENTRY_TRACING else nullcontext()
+    start = time.perf_counter()
+    try:
+        with span:
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if CONFIG.METRICS_ENABLED:
+            metrics.observe("request_phase_duration_seconds", elapsed, phase=name)
+        if has_request_context():
+            phases = g.setdefault("phases", {})
+            phases[name] = phases.get(name, 0.0) + elapsed
+
+
+def server_timing(phases: dict[str, float]) -> str:
+    """`Server-Timing` header value of phase durations in seconds, e.g. "db;dur=1.2"."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases.items())
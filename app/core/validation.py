@@ -0,0 +1,123 @@
+"""Compiled request validators.
+
+`CompiledSchema` turns a marshmallow schema into a specialised `load` function built
+once at startup. It returns the same data and raises `ValidationError` with the same
+messages as `Schema.load`, without going through marshmallow's generic load machinery.
+Only flat schemas of `String` fields (including `Email`) are compiled, anything else
+falls back to `Schema.load`.
+"""
+
+from collections.abc import Mapping
+from typing import Any, Callable, Union
+
+from marshmallow import RAISE, Schema, ValidationError, fields, missing, validate
+
+
+def _is_compilable(schema: Schema) -> bool:
+    """Check the schema has no hooks, options or fields the compiled loader can't honour."""
+    return (
+        not any(schema._hooks.values())
+        and not schema.only
+        and not schema.exclude
+        and not schema.partial
+        and all(
+            type(field) in (fields.String, fields.Email)
+            and field.load_default is missing
+            and not field.allow_none
+            for field in schema.load_fields.values()
+        )
+    )
+
+
+def _compile_field(field: fields.Field) -> Callable[[Any], Any]:
+    """Build a function deserializing one String field, raising ValidationError on failure."""
+    invalid = field.error_messages["invalid"]
+    validator_failed = field.error_messages["validator_failed"]
+    validators = list(field.validators)
+
+    def check_type(value):
+        if isinstance(value, str):
+            return value
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        raise ValidationError(invalid)
+
+    if not validators:
+        return check_type
+
+    def check(value):
+        value = check_type(value)
+        errors = []
+        for validator in validators:
+            try:
+                result = validator(value)
+                if not isinstance(validator, validate.Validator) and result is False:
+                    errors.append(validator_failed)
+            except ValidationError as error:
+                errors.extend(error.messages)
+        if errors:
+            raise ValidationError(errors)
+        return value
+
+    return check
+
+
+def compile_schema(schema: Schema) -> Callable[[Any], dict]:
+    """Generate a `load` function for the schema, or return `schema.load` if it can't be compiled."""
+    if not _is_compilable(schema):
+        return schema.load
+
+    checks = [
+        (
+            name,
+            field.data_key or name,
+            field.required,
+            field.error_messages["required"],
+            field.error_messages["null"],
+            _compile_field(field),
+        )
+        for name, field in schema.load_fields.items()
+    ]
+    known_keys = frozenset(data_key for _, data_key, *_ in checks)
+    raise_unknown = schema.unknown == RAISE
+    invalid_type = schema.error_messages["type"]
+    unknown_field = schema.error_messages["unknown"]
+
+    def load(data: Any) -> dict:
+        if not isinstance(data, Mapping):
+            raise ValidationError({"_schema": [invalid_type]})
+        result, errors = {}, {}
+        for name, data_key, required, required_message, null_message, check in checks:
+            if data_key not in data:
+                if required:
+                    errors[data_key] = [required_message]
+                continue
+            value = data[data_key]
+            if value is None:
+                errors[data_key] = [null_message]
+                continue
+            try:
+                result[name] = check(value)
+            except ValidationError as error:
+                errors[data_key] = error.messages
+        if raise_unknown:
+            for key in data.keys() - known_keys:
+                errors[key] = [unknown_field]
+        if errors:
+            raise ValidationError(errors, data=data, valid_data=result)
+        return result
+
+    return load
+
+
+class CompiledSchema:
+    """Drop-in for a schema instance used only to `load` requests."""
+
+    def __init__(self, schema: Schema):
+        self.schema = schema
+        self.load = compile_schema(schema)
+
+
+def request_validator(schema: Schema, compiled: bool) -> Union[Schema, CompiledSchema]:
+    """Wrap the schema in a `CompiledSchema` when `compiled`, return it as is otherwise."""
+    return CompiledSchema(schema) if compiled else schema
@@ -1,8 +1,16 @@
-from flask import request
+import logging
+import time
+from flask import g, request
 from app.api import app
+from app.auth.auth_service import email_batcher, reset_batcher, user_cache
 from app.auth.router import auth_router
-from app.utils import set_request_id, validate_client_version
-from app.auth.utils import check_authenticated
+from app.auth.utils import token_cache
+from app.core.config import CONFIG
+from app.core.logger import log_handler
+from app.core.metrics import metrics
+from app.core.profiler import start_profiling, stop_profiling
+from app.core.timing import server_timing
+from app.utils import is_metrics_scraper, set_request_id, validate_client_version
 from sentry_sdk import capture_exception
 
 
@@ -24,6 +32,12 @@ def pre_request_hook():
     """Hooks to run before each request."""
     set_request_id(request)  # Set request ID
     app.server_logger.info(f"{request.method} {request.path}")  # Log request start
+    g.profiler = start_profiling(request)
+    if CONFIG.METRICS_ENABLED:
+        request.environ["request_start"] = time.perf_counter()
+        metrics.add("http_requests_in_flight", 1)
+        if request.endpoint == "metrics_endpoint":
+            return  # Scrapers don't send a client version
 
     is_valid = validate_client_version(request)  # Validate client version
     if not is_valid:
@@ -32,16 +46,72 @@ def pre_request_hook():
         )
         return {"error": "Unsupported client version."}, 400
 
-    check_authenticated(
-        request
-    )  # If request is authenticated, set customer ID and is_authenticated flag
+    # Authentication is resolved lazily by `authenticate()` and `get_customer_id()`
 
 
 @app.after_request
 def post_request_hook(response):
     """Hooks to run after each request."""
-    app.server_logger.info(f"{request.method} {request.path} {response.status_code}")
+    # Failed requests are logged as warnings, so sampling of INFO never drops them
+    level = logging.WARNING if response.status_code >= 400 else logging.INFO
+    app.server_logger.log(level, f"{request.method} {request.path} {response.status_code}")
+    if CONFIG.SERVER_TIMING and "phases" in g:
+        response.headers["Server-Timing"] = server_timing(g.phases)
+    # Route templates, not paths, so the number of series stays bounded
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    query_count = g.get("query_count", 0)
+    budget = CONFIG.QUERY_BUDGETS.get(endpoint, CONFIG.DEFAULT_QUERY_BUDGET)
+    if query_count > budget:
+        app.server_logger.warning(
+            f"{request.method} {endpoint} ran {query_count} queries, over its budget of {budget}"
+        )
+    if "request_start" in request.environ:
+        metrics.inc("db_queries_total", query_count, endpoint=endpoint)
+        metrics.inc("db_query_seconds_total", g.get("query_time", 0.0), endpoint=endpoint)
+        duration = time.perf_counter() - request.environ["request_start"]
+        metrics.observe(
+            "http_request_duration_seconds", duration, endpoint=endpoint, method=request.method
+        )
+        metrics.inc(
+            "http_requests_total",
+            endpoint=endpoint,
+            method=request.method,
+            status=response.status_code,
+        )
     return response
 
 
+@app.teardown_request
+def teardown_request_hook(error):
+    """Hooks to run after each request, even when it failed."""
+    if "request_start" in request.environ:
+        metrics.add("http_requests_in_flight", -1)
+    if g.get("profiler"):
+        path = stop_profiling(g.profiler, request.environ["request_id"])
+        app.server_logger.info(f"Profile written to {path}")
+
+
+def collect_runtime_metrics():
+    """Counters kept by the caches, the email batchers and the log handler."""
+    for name, cache in (("user", user_cache), ("token", token_cache)):
+        stats = cache.stats()
+        yield "counter", "cache_hits_total", {"cache": name}, stats["hits"]
+        yield "counter", "cache_misses_total", {"cache": name}, stats["misses"]
+    for name, batcher in (("email", email_batcher), ("reset", reset_batcher)):
+        yield "counter", "email_batches_lost_total", {"batcher": name}, batcher.failures
+    yield "counter", "log_records_dropped_total", {}, getattr(log_handler, "dropped", 0)
+
+
+if CONFIG.METRICS_ENABLED:
+    metrics.register_collector(collect_runtime_metrics)
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        """Metrics of all workers in the Prometheus text format."""
+        if not is_metrics_scraper(request):
+            app.client_logger.warning("Unauthorized metrics scrape")
+            return {"error": "Forbidden."}, 403
+        return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
 app.register_blueprint(auth_router)
@@ -1,9 +1,11 @@
-import bcrypt
+import hashlib
 from sqlalchemy import MetaData
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import validates
 
+from app.core import hashers
+
 
 meta = MetaData(
     # For naming constraints, used by alembic
@@ -29,31 +31,54 @@ class User(db.Model):
     customer_id = db.Column(db.String, primary_key=True, index=True)
     email = db.Column(db.String, unique=True, index=True, nullable=False)
     hashed_password = db.Column(db.String)
-    salt = db.Column(db.String)
     is_active = db.Column(db.Boolean, default=True)
     country = db.Column(db.String(2), nullable=False)
     language = db.Column(
         db.String(2), nullable=False, default="en", server_default="en"
     )
-    verification_code = db.Column(db.String)
-    verification_code_expiry = db.Column(db.DateTime)
 
     def check_password(self, password: str) -> bool:
         """Check if the given password matches the stored password."""
-        hash_password = bcrypt.hashpw(
-            password.encode("utf-8"), self.salt.encode("utf-8")
-        ).decode("utf-8")
-        return hash_password == self.hashed_password
+        return hashers.check_password(password, self.hashed_password)
+
+    def needs_rehash(self) -> bool:
+        """Check if the stored hash was made by another hasher or with other parameters."""
+        return hashers.needs_rehash(self.hashed_password)
 
     @validates("language")
     def validate_language(self, key, value):
-        if value not in self.VALID_LANGUAGES:
+        return self.check_language(value)
+
+    @classmethod
+    def check_language(cls, value):
+        if value not in cls.VALID_LANGUAGES:
             raise ValueError("Invalid language")
         return value
 
+    @classmethod
+    def validate_values(cls, values: dict) -> dict:
+        """Validate values written by a bulk UPDATE, which bypasses `@validates`."""
+        if "language" in values:
+            cls.check_language(values["language"])
+        return values
+
     def set_password(self, password: str) -> None:
-        """Set the user's hashed password and salt. Does not commit to the database."""
-        self.salt = bcrypt.gensalt().decode("utf-8")
-        self.hashed_password = bcrypt.hashpw(
-            password.encode("utf-8"), self.salt.encode("utf-8")
-        ).decode("utf-8")
+        """Set the user's hashed password. Does not commit to the database."""
+        self.hashed_password = hashers.make_password(password)
+
+
+class PasswordResetCode(db.Model):
+    """The pending password reset of a user, a new request replaces the previous code."""
+
+    __tablename__ = "password_reset_codes"
+
+    customer_id = db.Column(
+        db.String, db.ForeignKey("users.customer_id", ondelete="CASCADE"), primary_key=True
+    )
+    # SHA-256 hex digest, codes are random UUIDs so a fast hash is enough
+    code_hash = db.Column(db.String(64), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    @staticmethod
+    def hash_code(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
@@ -1,3 +1,6 @@
+import hmac
+from itertools import islice
+from typing import Iterable, Iterator
 from uuid import uuid4
 
 from app.core.config import CONFIG
@@ -30,3 +33,21 @@ def validate_client_version(request):
             if patch < CONFIG.CLIENT_PATCH_VERSION:
                 return False
     return True
+
+
+def is_metrics_scraper(request):
+    """Checks the request sends `Authorization: Bearer <METRICS_TOKEN>`.
+
+    Without a configured token only requests from localhost are allowed.
+    """
+    if not CONFIG.METRICS_TOKEN:
+        return request.remote_addr in ("127.0.0.1", "::1")
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    return hmac.compare_digest(token.encode("utf-8"), CONFIG.METRICS_TOKEN.encode("utf-8"))
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield lists of up to `size` items from `iterable` without materializing it."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,68 @@
+"""Benchmarks email dispatch, one SMTP session per message vs batches over one connection.
+
+Sends to the in-process SMTP stand-in from the tests unless --host is given. Broker
+round trips aren't included: per-message dispatch also costs one Celery task per email,
+batching one per batch.
+
+Usage: python -m benchmarks.email_dispatch [--messages 2000] [--batch-size 100] [--host H --port P]
+"""
+
+import argparse
+import time
+from contextlib import nullcontext
+
+from app.core.mailer import SMTPMailer
+from tests.smtp_server import SMTPServer
+
+
+def measure(send, messages: list) -> float:
+    """Messages/sec of `send` over all the messages."""
+    start = time.perf_counter()
+    send(messages)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def per_message(host: str, port: int):
+    def send(messages):
+        for message in messages:
+            mailer = SMTPMailer(host, port)
+            mailer.send([message])
+            mailer.close()
+
+    return send
+
+
+def batched(host: str, port: int, batch_size: int):
+    def send(messages):
+        mailer = SMTPMailer(host, port)
+        for i in range(0, len(messages), batch_size):
+            mailer.send(messages[i : i + batch_size])
+        mailer.close()
+
+    return send
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000, help="Emails per run")
+    parser.add_argument("--batch-size", type=int, default=100, help="Emails per batch")
+    parser.add_argument("--host", help="SMTP server, defaults to a local stand-in")
+    parser.add_argument("--port", type=int, default=25)
+    args = parser.parse_args()
+
+    messages = [
+        (f"user{i}@example.com", "Password Reset", f"Use this verification code: {i}")
+        for i in range(args.messages)
+    ]
+    with nullcontext() if args.host else SMTPServer() as server:
+        host, port = (args.host, args.port) if args.host else ("127.0.0.1", server.port)
+        tasks = -(-args.messages // args.batch_size)
+        print(f"{'dispatch':<20} {'emails/sec':>12} {'tasks':>8}")
+        rate = measure(per_message(host, port), messages)
+        print(f"{'per message':<20} {rate:>12.1f} {args.messages:>8}")
+        rate = measure(batched(host, port, args.batch_size), messages)
+        print(f"{'batched':<20} {rate:>12.1f} {tasks:>8}")
+
+
+if __name__ == "__main__":
+    main()
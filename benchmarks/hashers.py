@@ -0,0 +1,61 @@
+"""Benchmarks password hashers.
+
+Reports hashes/sec and peak memory for each backend and parameter set, each measured
+in a fresh process so memory of one run doesn't leak into the next.
+
+Usage: python -m benchmarks.hashers [--seconds 2]
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+
+from app.core.hashers import BcryptHasher, PBKDF2Hasher, ScryptHasher
+
+
+CANDIDATES = [
+    BcryptHasher(rounds=10),
+    BcryptHasher(rounds=12),
+    ScryptHasher(n=2**14, r=8, p=1),
+    ScryptHasher(n=2**15, r=8, p=1),
+    PBKDF2Hasher(iterations=310_000),
+    PBKDF2Hasher(iterations=600_000),
+]
+
+
+def describe(hasher) -> str:
+    params = ", ".join(f"{key}={value}" for key, value in vars(hasher).items())
+    return f"{hasher.algorithm}({params})"
+
+
+def run(hasher, seconds: float) -> tuple[float, float]:
+    """Hash for `seconds`, returns (hashes/sec, peak memory growth in MB)."""
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    encoded = hasher.hash("benchmark password")  # Warm up
+    hashes = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        hasher.verify("benchmark password", encoded)
+        hashes += 1
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return hashes / elapsed, (peak - baseline) / 1024  # ru_maxrss is in KB on Linux
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2, help="Duration per hasher")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'hasher':<45} {'hashes/sec':>12} {'peak MB':>10}")
+    for hasher in CANDIDATES:
+        with context.Pool(1) as pool:
+            rate, memory = pool.apply(run, (hasher, args.seconds))
+        print(f"{describe(hasher):<45} {rate:>12.1f} {memory:>10.1f}")
+    print("Hashes/sec is per core, multiply by the login workers to get capacity.")
+
+
+if __name__ == "__main__":
+    main()
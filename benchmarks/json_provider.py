@@ -0,0 +1,65 @@
+"""Benchmarks JSON parsing and encoding, Flask's default provider vs the fast provider.
+
+Uses the real request and response shapes of the login and user endpoints.
+
+Usage: FLASK_ENV=testing python -m benchmarks.json_provider [--number 20000]
+"""
+
+import argparse
+import timeit
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.api import app
+from app.core.json_provider import FastJSONProvider, orjson
+
+
+USER = {
+    "country": "FR",
+    "customer_id": "8b4a1343-292d-45ed-ba5f-846fa9167ede",
+    "email": "njmekwhvmncrzuhwja@protonmail.com",
+    "language": "en",
+}
+JWT = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9." + "a" * 220 + "." + "b" * 43
+RESPONSES = {
+    "login response": {"data": {"user": USER, "jwt": JWT}},
+    "user response": {"data": {"user": USER}},
+    "error response": {"errors": {"email": ["Missing data for required field."]}},
+}
+REQUESTS = {
+    "login request": b'{"email": "dummy@example.com", "password": "dummy"}',
+    "update request": b'{"language": "en"}',
+}
+
+
+def measure(fn, number: int) -> float:
+    """Best of three runs, in microseconds per call."""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20_000, help="Calls per variant")
+    args = parser.parse_args()
+    if not orjson:
+        raise SystemExit("orjson is not installed, the app uses the default provider.")
+
+    providers = {"default": DefaultJSONProvider(app), "fast": FastJSONProvider(app)}
+    print(f"{'payload':<16} {'default':>10} {'fast':>10} {'speedup':>8}")
+    with app.app_context():
+        for name, payload in RESPONSES.items():
+            default, fast = (
+                measure(lambda: provider.response(payload), args.number)
+                for provider in providers.values()
+            )
+            print(f"{name:<16} {default:>8.2f}us {fast:>8.2f}us {default / fast:>7.1f}x")
+        for name, body in REQUESTS.items():
+            default, fast = (
+                measure(lambda: provider.loads(body), args.number)
+                for provider in providers.values()
+            )
+            print(f"{name:<16} {default:>8.2f}us {fast:>8.2f}us {default / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
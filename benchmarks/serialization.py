@@ -0,0 +1,44 @@
+"""Benchmarks serialization of the user response payload.
+
+Compares a fresh marshmallow schema per request (the previous router behaviour), a
+reused schema instance and the fast path serializer.
+
+Usage: FLASK_ENV=testing python -m benchmarks.serialization [--number 20000]
+"""
+
+import argparse
+import timeit
+
+from app.auth import schemas
+from app.sql_models import User
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20_000, help="Dumps per variant")
+    args = parser.parse_args()
+
+    user = User(
+        customer_id="8b4a1343-292d-45ed-ba5f-846fa9167ede",
+        email="dummy@example.com",
+        country="FR",
+        language="en",
+    )
+    payload = {"data": {"user": user, "jwt": "ey..."}}
+    assert schemas.UserResponse().dump(payload) == schemas.dump_user_response(user, "ey...")
+
+    variants = {
+        "marshmallow, new schema per request": lambda: schemas.UserResponse().dump(payload),
+        "marshmallow, reused schema": lambda: schemas.user_response.dump(payload),
+        "fast path": lambda: schemas.dump_user_response(user, "ey..."),
+    }
+    baseline = None
+    for name, dump in variants.items():
+        seconds = min(timeit.repeat(dump, number=args.number, repeat=3))
+        per_call = seconds / args.number * 1e6
+        baseline = baseline or per_call
+        print(f"{name:<40} {per_call:>8.2f}us/request {baseline / per_call:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,95 @@ def cli():
 
 @cli.command(help="Create new users from JSONL file.")
 @click.argument("file", type=click.Path(exists=True))
-def create_users(file: str) -> None:
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Rows inserted per transaction. Defaults to IMPORT_BATCH_SIZE.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Processes hashing plaintext passwords. Defaults to all cores.",
+)
+@click.option(
+    "--restart", is_flag=True, help="Ignore the checkpoint of a previous run."
+)
+def create_users(file: str, batch_size: int, workers: int, restart: bool) -> None:
     """Create new users from JSONL file."""
     from app.auth.auth_service import AuthService
 
-    AuthService().create_users(file)
+    AuthService().create_users(
+        file, batch_size=batch_size, workers=workers, restart=restart
+    )
+
+
+@cli.command(help="Pick the bcrypt cost that hashes within a target latency.")
+@click.option(
+    "--target-ms",
+    type=click.FloatRange(min=0),
+    default=250,
+    show_default=True,
+    help="Maximum time a single hash may take.",
+)
+def calibrate_bcrypt(target_ms: float) -> None:
+    """Measure bcrypt on this machine and recommend BCRYPT_ROUNDS."""
+    from app.core.hashers import calibrate_bcrypt_rounds
+
+    timings = calibrate_bcrypt_rounds(target_ms)
+    for rounds, duration in timings:
+        click.echo(f"rounds={rounds}: {duration:.1f}ms")
+    within_target = [rounds for rounds, duration in timings if duration <= target_ms]
+    if not within_target:
+        click.echo(f"Even the minimum cost takes longer than {target_ms}ms.")
+        return
+    click.echo(f"Recommended: BCRYPT_ROUNDS={within_target[-1]}")
+
+
+@cli.command(help="Report request counts, statuses, latencies and top customers from logs.")
+@click.argument("files", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--top", type=int, default=10, show_default=True, help="Customers to list.")
+def analyze_logs(files: tuple, top: int) -> None:
+    """Stream log files, oldest first, and print a request report."""
+    from app.core.log_analysis import LogReport, read_lines
+
+    report = LogReport()
+    for file in files:
+        report.add(read_lines(file))
+
+    click.echo(f"{'path':<30} {'requests':>10} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for path, count in report.requests.most_common():
+        latency = report.latency_summary(path)
+        click.echo(
+            f"{path:<30} {count:>10}"
+            + "".join(f" {latency[key]:>6}ms" for key in ("p50", "p90", "p99", "max"))
+        )
+    click.echo("\nStatus codes:")
+    for status, count in sorted(report.statuses.items()):
+        click.echo(f"  {status}: {count}")
+    click.echo(f"\nTop {top} customers:")
+    for customer_id, count in report.customers.most_common(top):
+        click.echo(f"  {customer_id}: {count}")
+    if report.unpaired:
+        click.echo(f"\n{report.unpaired} requests had no start line, latency unknown.")
+
+
+@cli.command(help="Report the top functions across request profiles.")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--top", type=int, default=20, show_default=True, help="Functions to list.")
+@click.option(
+    "--sort",
+    type=click.Choice(["cumulative", "tottime", "ncalls"]),
+    default="cumulative",
+    show_default=True,
+    help="Order of the functions.",
+)
+def profile_report(directory: str, top: int, sort: str) -> None:
+    """Aggregate the `.prof` files written by the request profiler."""
+    from app.core.profiler import profile_report
+
+    click.echo(profile_report(directory, sort=sort, top=top))
 
 
 if __name__ == "__main__":
@@ -1,16 +1,70 @@
 from celery import Celery
+from celery.utils.log import get_task_logger
 from app.core.config import CONFIG
+from app.core.mailer import mailer
 
 
 # Create the Celery application with redis as the broker
 app = Celery("tasks", broker=CONFIG.CELERY_BROKER_URL)
+# Run by `celery -A tasks beat`
+app.conf.beat_schedule = {
+    "purge-expired-reset-codes": {
+        "task": "tasks.purge_expired_reset_codes",
+        "schedule": CONFIG.RESET_CODE_PURGE_INTERVAL,
+    },
+}
 
+logger = get_task_logger(__name__)
 
-@app.task
+
+# Retried when the SMTP server can't be reached, messages it rejects aren't retried
+@app.task(autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
 def send_email(email: str, subject: str, body: str):
     """Send an email to the user"""
-    # Implementation of sending an email
-    print(f"Email sent to {email} with subject: {subject} and body: {body}")
+    if mailer.send([(email, subject, body)]):
+        logger.error(f"Email failed for: {email}")
+
+
+@app.task(autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def send_emails(messages: list):
+    """Send a batch of (email, subject, body) over one SMTP connection"""
+    failed = mailer.send(messages)
+    if failed:
+        logger.error(f"Emails failed for: {', '.join(failed)}")
+    return len(messages) - len(failed)
+
+
+# Retried like `send_email`, the email is sent from here. A retry replaces the code.
+@app.task(autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def start_password_reset(email: str):
+    """Create a verification code for the user with this email, if any, and email it"""
+    # Imported here as the Flask app imports this module to enqueue tasks
+    from app.api import app as flask_app
+    from app.auth.auth_service import auth_service
+
+    with flask_app.app_context():
+        # Already in a worker, send the email from here rather than enqueue it
+        auth_service.reset_password(email, notify_async=False)
+
+
+@app.task
+def start_password_resets(emails: list):
+    """`start_password_reset` for a batch of emails, sent by one `send_emails` task"""
+    from app.api import app as flask_app
+    from app.auth.auth_service import auth_service
+
+    with flask_app.app_context():
+        return auth_service.reset_passwords(emails)
+
+
+@app.task
+def purge_expired_reset_codes():
+    """Delete expired password reset codes"""
+    from app.api import app as flask_app
+    from app.auth.auth_service import auth_service
+
+    with flask_app.app_context():
+        return auth_service.purge_expired_reset_codes()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+"""Minimal in-process SMTP server standing in for a real one in tests and benchmarks.
+
+Accepts every message, keeping them in `messages` and counting `connections`, except
+those to a recipient in `rejected`.
+"""
+
+import socketserver
+import threading
+from email import message_from_bytes
+from email.message import Message
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self) -> None:
+        self.server.connections += 1
+        recipient = None
+        self.reply("220 localhost SMTP stand-in")
+        while line := self.rfile.readline():
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith("RCPT TO"):
+                recipient = command[len("RCPT TO:") :].strip("<> ").lower()
+                self.reply("250 OK")
+            elif command.startswith(("MAIL FROM", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA" and recipient in self.server.rejected:
+                self.reply("554 Transaction failed")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.add(self.read_data())
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def read_data(self) -> bytes:
+        lines = []
+        while (line := self.rfile.readline()) not in (b".\r\n", b""):
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), SMTPHandler)
+        self.messages: list[Message] = []
+        self.connections = 0
+        self.rejected: set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def add(self, data: bytes) -> None:
+        with self._lock:
+            self.messages.append(message_from_bytes(data))
+
+    def __enter__(self) -> "SMTPServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self.server_close()
@@ -1,10 +1,25 @@
 """Unit tests for the auth module."""
 
+import json
+import os
+import tempfile
+import threading
 import unittest
 from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError
 from app.server import app
 from app.api import db
-from app.sql_models import User
+from app.sql_models import PasswordResetCode, User
+from app.auth.auth_service import AuthService, email_batcher, reset_batcher, user_cache
+from app.auth.exceptions import VerificationUnavailable
+from app.auth.utils import password_verifier, token_cache
+from app.core.cache import create_cache
+from app.core.config import CONFIG
+from app.core.mailer import SMTPMailer
+from tasks import send_emails, start_password_reset, start_password_resets
+from tests.smtp_server import SMTPServer
 
 
 class BaseAuthTest(unittest.TestCase):
@@ -18,6 +33,7 @@ class BaseAuthTest(unittest.TestCase):
         """Set up test environment."""
         app.config.from_object("app.core.config.TestingConfig")
         self.app = app.test_client()
+        user_cache.clear()
         with app.app_context():
             db.drop_all()
             db.create_all()
@@ -125,10 +141,134 @@ class TestLogin(BaseAuthTest):
         )
         self.assertEqual(response.status_code, 400)
 
+    def test_login_skips_token_decoding(self):
+        """Test unauthenticated endpoints never decode a bearer token."""
+        with patch("app.auth.utils.decode_token") as decode_token:
+            response = self.app.post(
+                "/auth/login",
+                json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+                headers={
+                    "Authorization": "Bearer invalid",
+                    "X-Client-Version": self.VALID_CLIENT_VERSION,
+                },
+            )
+        self.assertEqual(response.status_code, 200)
+        decode_token.assert_not_called()
+
+    def test_login_rehashes_outdated_cost(self):
+        """Test a successful login upgrades a hash made with a different cost."""
+        with app.app_context():
+            user = db.session.query(User).filter_by(email=self.DUMMY_EMAIL).first()
+            with patch.object(CONFIG, "BCRYPT_ROUNDS", 5):
+                user.set_password(self.DUMMY_PASSWORD)
+            db.session.commit()
+            self.assertTrue(user.needs_rehash())
+        response = self.app.post(
+            "/auth/login",
+            json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+            headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+        )
+        self.assertEqual(response.status_code, 200)
+        with app.app_context():
+            user = db.session.query(User).filter_by(email=self.DUMMY_EMAIL).first()
+            self.assertFalse(user.needs_rehash())
+            self.assertTrue(user.check_password(self.DUMMY_PASSWORD))
+
+    def test_login_skips_rehash_when_busy(self):
+        """Test a correct login succeeds when the pool has no room left to rehash."""
+        with app.app_context():
+            user = db.session.query(User).filter_by(email=self.DUMMY_EMAIL).first()
+            with patch.object(CONFIG, "BCRYPT_ROUNDS", 5):
+                user.set_password(self.DUMMY_PASSWORD)
+            db.session.commit()
+        with patch.object(password_verifier, "rehash", side_effect=VerificationUnavailable):
+            response = self.app.post(
+                "/auth/login",
+                json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+                headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+            )
+        self.assertEqual(response.status_code, 200)
+        with app.app_context():
+            user = db.session.query(User).filter_by(email=self.DUMMY_EMAIL).first()
+            self.assertTrue(user.needs_rehash())
+
+    def test_server_timing(self):
+        """Test the login phases are reported in the Server-Timing header when enabled."""
+        with patch.object(CONFIG, "SERVER_TIMING", True):
+            response = self.app.post(
+                "/auth/login",
+                json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+                headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+            )
+        phases = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+        self.assertEqual(phases, ["validate", "db", "password", "token", "serialize"])
+        with patch.object(CONFIG, "SERVER_TIMING", False):
+            response = self.app.post(
+                "/auth/login",
+                json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+                headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response.headers)
+
+    def test_query_tracking(self):
+        """Test slow queries and requests over their query budget are logged."""
+        with patch.object(CONFIG, "SLOW_QUERY_THRESHOLD_MS", 0), patch.object(
+            CONFIG, "DEFAULT_QUERY_BUDGET", 0
+        ), patch.object(app.server_logger, "warning") as warning:
+            self.app.post(
+                "/auth/login",
+                json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+                headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+            )
+        messages = [call.args[0] for call in warning.call_args_list]
+        self.assertTrue(messages[0].startswith("Slow query"))
+        self.assertIn("FROM users", messages[0])
+        self.assertEqual(
+            messages[-1], "POST /auth/login ran 1 queries, over its budget of 0"
+        )
+
+    def test_query_tracking_outside_requests(self):
+        """Test CLI statements aren't logged and long statements are truncated."""
+        long_statement = sa.text("SELECT 1 -- " + "x" * 1000)
+        with patch.object(CONFIG, "SLOW_QUERY_THRESHOLD_MS", 0), patch.object(
+            app.server_logger, "warning"
+        ) as warning:
+            with app.app_context():
+                db.session.execute(long_statement)
+            warning.assert_not_called()
+            with app.test_request_context(), app.app_context():
+                db.session.execute(long_statement)
+        (message,) = warning.call_args.args
+        self.assertTrue(message.endswith("x" * 488 + "..."))
+
+    def test_verification_queue_full(self):
+        """Test the login endpoint sheds load when all verification slots are taken."""
+        with patch.object(password_verifier, "_slots", threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = self.app.post(
+                "/auth/login",
+                json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+                headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+
 
 class TestForgotPassword(BaseAuthTest):
     """Test the forgot password endpoint."""
 
+    def _request_code(self) -> str:
+        """Send a forgot password request and return the emailed verification code."""
+        with patch("app.auth.auth_service.send_email") as send_email:
+            response = self.app.post(
+                "/auth/forgot_password",
+                json={"email": self.DUMMY_EMAIL},
+                headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+            )
+        self.assertEqual(response.status_code, 200)
+        return send_email.delay.call_args.args[2].rsplit(" ", 1)[-1]
+
     def test_forgot_password(self):
         """Test the forgot password endpoint."""
         response = self.app.post(
@@ -157,28 +297,109 @@ class TestForgotPassword(BaseAuthTest):
         )
         self.assertEqual(response.status_code, 400)
 
+    def test_forgot_password_async(self):
+        """Test the whole flow runs in one task, which sends the email itself."""
+        with patch.object(CONFIG, "FORGOT_PASSWORD_ASYNC", True), patch.object(
+            start_password_reset, "delay", side_effect=start_password_reset
+        ) as delay, patch("app.auth.auth_service.send_email") as send_email:
+            for email in (self.DUMMY_EMAIL, "invalid." + self.DUMMY_EMAIL):
+                response = self.app.post(
+                    "/auth/forgot_password",
+                    json={"email": email},
+                    headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+                )
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(delay.call_count, 2)
+        send_email.delay.assert_not_called()
+        send_email.assert_called_once()
+        code = send_email.call_args.args[2].rsplit(" ", 1)[-1]
+        with app.app_context():
+            reset_code = db.session.get(PasswordResetCode, "123")
+            self.assertEqual(reset_code.code_hash, PasswordResetCode.hash_code(code))
+
+    def test_forgot_password_batched_email(self):
+        """Test the email is handed to the batcher instead of its own task."""
+        with patch.object(CONFIG, "EMAIL_BATCHING", True), patch.object(
+            email_batcher, "send_batch"
+        ) as send_batch, patch("app.auth.auth_service.send_email") as send_email:
+            response = self.app.post(
+                "/auth/forgot_password",
+                json={"email": self.DUMMY_EMAIL},
+                headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+            )
+            email_batcher.flush()
+        self.assertEqual(response.status_code, 200)
+        send_email.delay.assert_not_called()
+        ((batch,), _) = send_batch.call_args
+        self.assertEqual([email for email, _, _ in batch], [self.DUMMY_EMAIL])
+
+    def _flaky_mailer(self, server: SMTPServer) -> SMTPMailer:
+        """Mailer whose first connection is refused, as if the SMTP server was down."""
+        mailer = SMTPMailer("127.0.0.1", server.port)
+        connect = mailer._connect
+        mailer._connect = Mock(side_effect=[ConnectionRefusedError("SMTP down"), connect()])
+        return mailer
+
+    def _emailed_code(self, message) -> str:
+        return message.get_payload(decode=True).decode().strip().rsplit(" ", 1)[-1]
+
+    def test_forgot_password_async_smtp_down(self):
+        """Test the reset task is retried while the SMTP server is down."""
+        with SMTPServer() as server, patch("tasks.mailer", self._flaky_mailer(server)):
+            result = start_password_reset.apply(args=(self.DUMMY_EMAIL,))
+        self.assertEqual(result.state, "SUCCESS")
+        (message,) = server.messages
+        with app.app_context():
+            reset_code = db.session.get(PasswordResetCode, "123")
+            code_hash = PasswordResetCode.hash_code(self._emailed_code(message))
+            self.assertEqual(reset_code.code_hash, code_hash)
+
+    def test_forgot_password_async_batched(self):
+        """Test async resets are batched into one task, its emails retried while SMTP is down."""
+        with patch.object(CONFIG, "FORGOT_PASSWORD_ASYNC", True), patch.object(
+            CONFIG, "EMAIL_BATCHING", True
+        ), patch.object(
+            reset_batcher, "send_batch", side_effect=start_password_resets
+        ), patch.object(send_emails, "delay") as delay:
+            for email in (self.DUMMY_EMAIL, "invalid." + self.DUMMY_EMAIL):
+                response = self.app.post(
+                    "/auth/forgot_password",
+                    json={"email": email},
+                    headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+                )
+                self.assertEqual(response.status_code, 200)
+            reset_batcher.flush()
+        # Enqueued once the codes are committed, so the task's retries apply
+        ((messages,), _) = delay.call_args
+        self.assertEqual([email for email, _, _ in messages], [self.DUMMY_EMAIL])
+        with SMTPServer() as server, patch("tasks.mailer", self._flaky_mailer(server)):
+            result = send_emails.apply(args=(messages,))
+        self.assertEqual(result.result, 1)
+        (message,) = server.messages
+        with app.app_context():
+            reset_code = db.session.get(PasswordResetCode, "123")
+            code_hash = PasswordResetCode.hash_code(self._emailed_code(message))
+            self.assertEqual(reset_code.code_hash, code_hash)
+
     def test_reset_password(self):
         """Test the reset password endpoint."""
         # First, send a forgot password request
-        response = self.app.post(
-            "/auth/forgot_password",
-            json={"email": self.DUMMY_EMAIL},
-            headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
-        )
-        self.assertEqual(response.status_code, 200)
+        verification_code = self._request_code()
         # Then, reset the password
+        request = {
+            "email": self.DUMMY_EMAIL,
+            "password": "new_password",
+            "verification_code": verification_code,
+        }
+        headers = {"X-Client-Version": self.VALID_CLIENT_VERSION}
+        response = self.app.post("/auth/reset_password", json=request, headers=headers)
+        self.assertEqual(response.status_code, 200)
         with app.app_context():
             user = db.session.query(User).filter_by(email=self.DUMMY_EMAIL).first()
-        response = self.app.post(
-            "/auth/reset_password",
-            json={
-                "email": self.DUMMY_EMAIL,
-                "password": "new_password",
-                "verification_code": user.verification_code,
-            },
-            headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
-        )
-        self.assertEqual(response.status_code, 200)
+            self.assertTrue(user.check_password("new_password"))
+        # Codes are consumed by their first use
+        response = self.app.post("/auth/reset_password", json=request, headers=headers)
+        self.assertEqual(response.status_code, 400)
 
     def test_reset_password_invalid_code(self):
         """Test the reset password endpoint with an invalid code."""
@@ -220,18 +441,12 @@ class TestForgotPassword(BaseAuthTest):
     def test_reset_password_expired_verification_code(self):
         """Test the reset password endpoint with an expired verification code."""
         # First, send a forgot password request
-        response = self.app.post(
-            "/auth/forgot_password",
-            json={"email": self.DUMMY_EMAIL},
-            headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
-        )
-        self.assertEqual(response.status_code, 200)
+        verification_code = self._request_code()
         # Then, reset the password with an expired verification code
         with app.app_context():
-            user = db.session.query(User).filter_by(email=self.DUMMY_EMAIL).first()
-            user.verification_code_expiry = datetime.now() - timedelta(minutes=1)
+            reset_code = db.session.get(PasswordResetCode, "123")
+            reset_code.expires_at = datetime.now() - timedelta(minutes=1)
             db.session.commit()
-            verification_code = user.verification_code
         response = self.app.post(
             "/auth/reset_password",
             json={
@@ -243,6 +458,24 @@ class TestForgotPassword(BaseAuthTest):
         )
         self.assertEqual(response.status_code, 400)
 
+    def test_purge_expired_reset_codes(self):
+        """Test expired codes are deleted in batches and pending ones are kept."""
+        now = datetime.now()
+        with app.app_context():
+            for i in range(5):
+                db.session.add(
+                    User(email=f"user{i}@test.com", customer_id=str(i), language="en", country="US")
+                )
+                expires_at = now + timedelta(minutes=-1 if i else 1)
+                db.session.add(
+                    PasswordResetCode(customer_id=str(i), code_hash=str(i), expires_at=expires_at)
+                )
+            db.session.commit()
+            self.assertEqual(AuthService().purge_expired_reset_codes(batch_size=2), 4)
+            self.assertEqual(
+                [code.customer_id for code in db.session.query(PasswordResetCode)], ["0"]
+            )
+
 
 class TestGetCurrentUser(BaseAuthTest):
     """Test the get current user endpoint."""
@@ -269,6 +502,55 @@ class TestGetCurrentUser(BaseAuthTest):
         data = response.json["data"]
         self.assertEqual(data["user"]["email"], self.DUMMY_EMAIL)
 
+    def test_get_current_user_cached_jwt(self):
+        """Test a repeated JWT is served from the verified token cache."""
+        response = self.app.post(
+            "/auth/login",
+            json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+            headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+        )
+        jwt = response.json["data"]["jwt"]
+        token_cache.clear()
+        for _ in range(2):
+            response = self.app.get(
+                "/auth/user",
+                headers={
+                    "Authorization": f"Bearer {jwt}",
+                    "X-Client-Version": self.VALID_CLIENT_VERSION,
+                },
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_cache.stats()["misses"], 1)
+        self.assertEqual(token_cache.stats()["hits"], 1)
+
+    def test_redis_cache_down(self):
+        """Test the profile is read and updated from the database when Redis is down."""
+        response = self.app.post(
+            "/auth/login",
+            json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+            headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+        )
+        headers = {
+            "Authorization": f"Bearer {response.json['data']['jwt']}",
+            "X-Client-Version": self.VALID_CLIENT_VERSION,
+        }
+        timeout = CONFIG.USER_CACHE_REDIS_TIMEOUT
+        down = create_cache(
+            10, 60, redis_url="redis://localhost:1/0", prefix="user:", logger=Mock(), timeout=timeout
+        )
+        # An unreachable server is given up on as fast as a refused connection
+        connection_kwargs = down.client.connection_pool.connection_kwargs
+        self.assertEqual(connection_kwargs["socket_connect_timeout"], timeout)
+        self.assertEqual(connection_kwargs["socket_timeout"], timeout)
+        with patch("app.auth.auth_service.user_cache", down):
+            response = self.app.get("/auth/user", headers=headers)
+            self.assertEqual(response.status_code, 200)
+            response = self.app.patch("/auth/user", json={"language": "de"}, headers=headers)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(down.stats()["errors"], 3)  # get, set and the update's set
+        self.assertEqual(down.stats()["misses"], 1)
+        self.assertEqual(down.logger.warning.call_count, 3)
+
     def test_get_current_user_invalid_jwt(self):
         """Test the get current user endpoint with an invalid JWT."""
         response = self.app.get(
@@ -326,6 +608,25 @@ class TestUpdateUser(BaseAuthTest):
             user = db.session.query(User).filter_by(email=self.DUMMY_EMAIL).first()
         self.assertEqual(user.language, language)
 
+    def test_update_invalidates_cached_user(self):
+        """Test the cached profile is replaced after the user is updated."""
+        response = self.app.post(
+            "/auth/login",
+            json={"email": self.DUMMY_EMAIL, "password": self.DUMMY_PASSWORD},
+            headers={"X-Client-Version": self.VALID_CLIENT_VERSION},
+        )
+        headers = {
+            "Authorization": f"Bearer {response.json['data']['jwt']}",
+            "X-Client-Version": self.VALID_CLIENT_VERSION,
+        }
+        self.app.get("/auth/user", headers=headers)
+        response = self.app.get("/auth/user", headers=headers)
+        self.assertEqual(user_cache.stats()["hits"], 1)
+        self.assertEqual(response.json["data"]["user"]["language"], "en")
+        self.app.patch("/auth/user", json={"language": "de"}, headers=headers)
+        response = self.app.get("/auth/user", headers=headers)
+        self.assertEqual(response.json["data"]["user"]["language"], "de")
+
     def test_update_invalid_language(self):
         """Test the update user endpoint with an invalid language."""
         # First, log in
@@ -367,3 +668,158 @@ class TestUpdateUser(BaseAuthTest):
             },
         )
         self.assertEqual(response.status_code, 400)
+
+
+class TestCreateUsers(BaseAuthTest):
+    """Test the bulk user import used by the CLI."""
+
+    def _write_users(self, users):
+        """Write users to a temporary JSONL file and return its path."""
+        fd, path = tempfile.mkstemp(suffix=".jsonl")
+        with os.fdopen(fd, "w") as f:
+            for user in users:
+                f.write(json.dumps(user) + "\n")
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_create_users_in_batches(self):
+        """Test users are imported across several batches with language defaults."""
+        path = self._write_users(
+            [
+                {"customer_id": "1", "email": "a@test.com", "country": "DE"},
+                {"customer_id": "2", "email": "b@test.com", "country": "DE", "language": "de"},
+                {"customer_id": "3", "email": "c@test.com", "country": "FR", "language": "fr"},
+            ]
+        )
+        AuthService().create_users(path, batch_size=2)
+        with app.app_context():
+            languages = dict(db.session.query(User.customer_id, User.language).all())
+        self.assertEqual(languages, {"123": "en", "1": "en", "2": "de", "3": "en"})
+
+    def test_create_users_hashes_passwords(self):
+        """Test plaintext passwords are hashed in worker processes during import."""
+        path = self._write_users(
+            [
+                {"customer_id": str(i), "email": f"{i}@test.com", "country": "DE", "password": f"pass{i}"}
+                for i in range(3)
+            ]
+        )
+        AuthService().create_users(path, batch_size=2, workers=2)
+        with app.app_context():
+            user = db.session.query(User).filter_by(customer_id="2").first()
+            self.assertTrue(user.check_password("pass2"))
+
+    def test_create_users_rejects_invalid_passwords(self):
+        """Test rows whose password can't be hashed are rejected, not the import."""
+        path = self._write_users(
+            [
+                {"customer_id": "1", "email": "a@test.com", "country": "DE", "password": None},
+                {"customer_id": "2", "email": "b@test.com", "country": "DE", "password": "pass"},
+                {"customer_id": "3", "email": "c@test.com", "country": "DE", "password": 3},
+            ]
+        )
+        self.addCleanup(os.remove, f"{path}.rejects")
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                AuthService().create_users(path, batch_size=2, workers=workers, restart=True)
+                with open(f"{path}.rejects") as f:
+                    rejects = [json.loads(line)["row"]["customer_id"] for line in f]
+                self.assertEqual(rejects[-2:], ["1", "3"])
+                self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+                with app.app_context():
+                    user = db.session.query(User).filter_by(customer_id="2").first()
+                    self.assertTrue(user.check_password("pass"))
+                    self.assertEqual(db.session.query(User).count(), 2)
+
+    def test_create_users_without_passwords(self):
+        """Test no process pool is started for exports without passwords."""
+        path = self._write_users([{"customer_id": "1", "email": "a@test.com", "country": "DE"}])
+        with patch("app.auth.auth_service.ProcessPoolExecutor") as pool:
+            AuthService().create_users(path, workers=2)
+        pool.assert_not_called()
+        with app.app_context():
+            self.assertEqual(db.session.query(User).count(), 2)
+
+    def test_create_users_is_idempotent(self):
+        """Test re-running an import updates existing users instead of failing."""
+        path = self._write_users(
+            [{"customer_id": "1", "email": "a@test.com", "country": "DE"}]
+        )
+        AuthService().create_users(path)
+        with open(path, "w") as f:
+            f.write(json.dumps({"customer_id": "1", "email": "a@test.com", "country": "AT"}))
+        AuthService().create_users(path)
+        with app.app_context():
+            users = db.session.query(User).filter_by(email="a@test.com").all()
+        self.assertEqual([user.country for user in users], ["AT"])
+
+    def test_create_users_rejects_invalid_rows(self):
+        """Test unparsable and conflicting rows go to the reject file."""
+        path = self._write_users(
+            [
+                {"customer_id": "1", "email": "a@test.com", "country": "DE"},
+                {"customer_id": "2", "email": self.DUMMY_EMAIL, "country": "DE"},
+                {"customer_id": "3", "email": "c@test.com", "country": "DE"},
+            ]
+        )
+        with open(path, "a") as f:
+            f.write("not json\n")
+        self.addCleanup(os.remove, f"{path}.rejects")
+        AuthService().create_users(path, batch_size=10)
+        with open(f"{path}.rejects") as f:
+            rejects = [json.loads(line) for line in f]
+        self.assertEqual(rejects[0]["row"], "not json\n")
+        self.assertEqual(rejects[1]["row"]["customer_id"], "2")
+        with app.app_context():
+            self.assertEqual(db.session.query(User).count(), 3)
+
+    def test_create_users_ignores_unknown_keys(self):
+        """Test keys that aren't user columns are ignored on insert and on update."""
+        user = {"customer_id": "1", "email": "a@test.com", "country": "DE", "nickname": "a"}
+        path = self._write_users([user, user])
+        AuthService().create_users(path, batch_size=1)
+        self.assertFalse(os.path.exists(f"{path}.rejects"))
+        with app.app_context():
+            self.assertEqual(db.session.query(User).filter_by(customer_id="1").count(), 1)
+
+    def test_create_users_stops_on_database_errors(self):
+        """Test a lost connection stops the import at the last committed batch."""
+        path = self._write_users(
+            [
+                {"customer_id": "1", "email": "a@test.com", "country": "DE"},
+                {"customer_id": "2", "email": "b@test.com", "country": "DE"},
+            ]
+        )
+        self.addCleanup(os.remove, f"{path}.checkpoint")
+        error = OperationalError("INSERT", {}, Exception("server closed the connection"))
+        upsert = AuthService._upsert_statement
+        calls = []
+
+        def fail_second_batch(keys):
+            calls.append(keys)
+            if len(calls) > 1:
+                raise error
+            return upsert(keys)
+
+        with patch.object(AuthService, "_upsert_statement", side_effect=fail_second_batch):
+            AuthService().create_users(path, batch_size=1)
+        self.assertEqual(len(calls), 2)  # No row by row retry
+        self.assertFalse(os.path.exists(f"{path}.rejects"))
+        with open(f"{path}.checkpoint") as f:
+            offset = int(f.read())
+        with open(path, "rb") as f:
+            self.assertEqual(offset, len(f.readline()))
+
+    def test_create_users_resumes_from_checkpoint(self):
+        """Test an import resumes after the byte offset of the last committed batch."""
+        first = json.dumps({"customer_id": "1", "email": "a@test.com", "country": "DE"})
+        path = self._write_users(
+            [json.loads(first), {"customer_id": "2", "email": "b@test.com", "country": "DE"}]
+        )
+        with open(f"{path}.checkpoint", "w") as f:
+            f.write(str(len(first) + 1))
+        AuthService().create_users(path)
+        self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+        with app.app_context():
+            customer_ids = {user.customer_id for user in db.session.query(User)}
+        self.assertEqual(customer_ids, {"123", "2"})
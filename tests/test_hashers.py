@@ -0,0 +1,40 @@
+"""Unit tests for the password hashers."""
+
+import unittest
+from unittest.mock import patch
+from app.core import hashers
+from app.core.config import CONFIG
+
+
+class TestHashers(unittest.TestCase):
+    """Test each hasher and the self-describing hash helpers."""
+
+    HASHERS = [
+        hashers.BcryptHasher(rounds=4),
+        hashers.ScryptHasher(n=2**4, r=8, p=1),
+        hashers.PBKDF2Hasher(iterations=10),
+    ]
+
+    def test_hash_and_verify(self):
+        """Test every hasher verifies its own hashes and rejects wrong passwords."""
+        for hasher in self.HASHERS:
+            with self.subTest(hasher=hasher.algorithm):
+                encoded = hasher.hash("password")
+                self.assertTrue(hashers.check_password("password", encoded))
+                self.assertFalse(hashers.check_password("invalid", encoded))
+                self.assertFalse(hasher.needs_update(encoded))
+
+    def test_needs_rehash_other_algorithm(self):
+        """Test hashes made by another hasher than the configured one need a rehash."""
+        encoded = hashers.PBKDF2Hasher(iterations=10).hash("password")
+        with patch.object(CONFIG, "PASSWORD_HASHER", "bcrypt"):
+            self.assertTrue(hashers.needs_rehash(encoded))
+
+    def test_needs_rehash_other_parameters(self):
+        """Test hashes made with other parameters than configured need a rehash."""
+        encoded = hashers.PBKDF2Hasher(iterations=10).hash("password")
+        with patch.object(CONFIG, "PASSWORD_HASHER", "pbkdf2_sha256"):
+            with patch.object(CONFIG, "PBKDF2_ITERATIONS", 10):
+                self.assertFalse(hashers.needs_rehash(encoded))
+            with patch.object(CONFIG, "PBKDF2_ITERATIONS", 20):
+                self.assertTrue(hashers.needs_rehash(encoded))
@@ -0,0 +1,43 @@
+"""Unit tests for the fast JSON provider."""
+
+import unittest
+from datetime import datetime
+from uuid import UUID
+from flask.json.provider import DefaultJSONProvider
+from app.server import app
+from app.core.json_provider import FastJSONProvider, orjson
+
+
+@unittest.skipUnless(orjson, "orjson is not installed")
+class TestFastJSONProvider(unittest.TestCase):
+    """Test the orjson provider is interchangeable with Flask's default provider."""
+
+    PAYLOAD = {
+        "data": {"user": {"email": "dummy@test.com", "language": "en"}, "jwt": "ey..."},
+        "created": datetime(2024, 5, 2, 22, 53, 59),
+        "id": UUID("8b4a1343-292d-45ed-ba5f-846fa9167ede"),
+    }
+
+    def setUp(self):
+        self.fast = FastJSONProvider(app)
+        self.default = DefaultJSONProvider(app)
+
+    def test_dumps(self):
+        """Test encoded output decodes to the same data as the default provider's."""
+        self.assertEqual(
+            self.default.loads(self.fast.dumps(self.PAYLOAD)),
+            self.default.loads(self.default.dumps(self.PAYLOAD)),
+        )
+
+    def test_response(self):
+        """Test responses carry the same JSON body as the default provider's."""
+        with app.app_context():
+            fast = self.fast.response(self.PAYLOAD)
+            default = self.default.response(self.PAYLOAD)
+        self.assertEqual(fast.mimetype, "application/json")
+        self.assertEqual(fast.get_json(), default.get_json())
+
+    def test_loads_invalid(self):
+        """Test invalid JSON raises ValueError, which Flask turns into a 400."""
+        with self.assertRaises(ValueError):
+            self.fast.loads(b"{invalid")
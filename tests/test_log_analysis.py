@@ -0,0 +1,52 @@
+"""Unit tests for the log analysis used by `cli.py analyze-logs`."""
+
+import gzip
+import logging
+import os
+import tempfile
+import unittest
+from app.core.config import ProductionConfig
+from app.core.log_analysis import LogReport, read_lines
+
+
+LOG = b"""[2024-05-02 22:53:59,900][127.0.0.1][r1][None][/auth/login][logger.py][49][INFO][server]: POST /auth/login
+[2024-05-02 22:53:59,923][127.0.0.1][r1][None][/auth/login][logger.py][58][WARNING][client]: Invalid email or password
+[2024-05-02 22:53:59,950][127.0.0.1][r2][None][/auth/user][logger.py][49][INFO][server]: GET /auth/user
+[2024-05-02 22:53:59,960][127.0.0.1][r1][None][/auth/login][logger.py][49][INFO][server]: POST /auth/login 401
+{"time": "2024-05-02 22:54:00,010", "request_id": "r2", "customer_id": "123", "log_type": "server", "message": "GET /auth/user 200"}
+[2024-05-02 22:54:00,020][127.0.0.1][r3][123][/auth/user][logger.py][49][INFO][server]: GET /auth/user 200
+"""
+
+
+class TestLogReport(unittest.TestCase):
+    """Test request logs are paired and aggregated."""
+
+    def _write(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with (gzip.open if suffix.endswith(".gz") else open)(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_report(self):
+        """Test counts, statuses, latencies and customers of a text and JSON log."""
+        report = LogReport().add(read_lines(self._write(".log", LOG)))
+        self.assertEqual(report.requests, {"/auth/user": 2, "/auth/login": 1})
+        self.assertEqual(report.statuses, {"200": 2, "401": 1})
+        self.assertEqual(report.customers, {"123": 2})
+        self.assertEqual(report.latency_summary("/auth/login")["p50"], 60)
+        self.assertEqual(report.latency_summary("/auth/user")["max"], 60)
+        self.assertEqual(report.unpaired, 1)
+
+    def test_compressed_and_empty_files(self):
+        """Test rotated gzip segments are read and empty logs are skipped."""
+        report = LogReport()
+        report.add(read_lines(self._write(".log.1.gz", LOG)))
+        report.add(read_lines(self._write(".log", b"")))
+        self.assertEqual(sum(report.requests.values()), 3)
+
+    def test_production_logs_request_lines(self):
+        """Test production writes the INFO request lines the report pairs."""
+        self.assertLessEqual(ProductionConfig.LOG_LEVEL, logging.INFO)
+        self.assertGreater(ProductionConfig.LOG_SAMPLE_RATES.get(logging.INFO, 1.0), 0)
@@ -0,0 +1,165 @@
+"""Unit tests for the logger module."""
+
+import glob
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import tempfile
+import unittest
+from logging.handlers import WatchedFileHandler
+from unittest.mock import Mock, patch
+from app.server import app
+from app.core.logger import (
+    CompressingRotatingFileHandler,
+    JSONRequestFormatter,
+    LogSampler,
+    Logger,
+    RequestQueueHandler,
+    create_file_handler,
+    formatter,
+)
+
+
+class TestRequestQueueHandler(unittest.TestCase):
+    """Test the queue handler of the async logging mode."""
+
+    def _record(self, message="message"):
+        return logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+
+    def test_captures_request_context(self):
+        """Test request fields are captured when enqueued and formatted later."""
+        handler = RequestQueueHandler(queue.Queue())
+        with app.test_request_context("/auth/login", environ_base={"request_id": "abc"}):
+            handler.handle(self._record())
+        line = formatter.format(handler.queue.get_nowait())
+        self.assertIn("[abc][None][/auth/login]", line)
+
+    def test_drops_when_full(self):
+        """Test records are dropped and counted instead of blocking on a full queue."""
+        handler = RequestQueueHandler(queue.Queue(maxsize=1))
+        for _ in range(3):
+            handler.handle(self._record())
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertEqual(handler.dropped, 2)
+
+
+class TestJSONRequestFormatter(unittest.TestCase):
+    """Test the JSON log format."""
+
+    def test_format(self):
+        """Test records are formatted as JSON with the request fields."""
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "GET %s", ("/",), None)
+        with app.test_request_context("/auth/user", environ_base={"request_id": "abc"}):
+            entry = json.loads(JSONRequestFormatter().format(record))
+        self.assertEqual(entry["request_id"], "abc")
+        self.assertEqual(entry["path"], "/auth/user")
+        self.assertEqual(entry["message"], "GET /")
+        self.assertEqual(entry["level"], "INFO")
+
+
+class TestLogSampler(unittest.TestCase):
+    """Test log sampling."""
+
+    def test_rates(self):
+        """Test levels are kept or dropped according to their rate."""
+        sampler = LogSampler({logging.INFO: 0})
+        self.assertFalse(sampler.keep(logging.INFO))
+        self.assertTrue(sampler.keep(logging.WARNING))
+
+    def test_same_decision_per_request(self):
+        """Test all records of a request share one sampling decision."""
+        sampler = LogSampler({logging.INFO: 0.5})
+        decisions = set()
+        for request_id in map(str, range(20)):
+            with app.test_request_context(environ_base={"request_id": request_id}):
+                kept = {sampler.keep(logging.INFO) for _ in range(5)}
+            self.assertEqual(len(kept), 1)
+            decisions |= kept
+        self.assertEqual(decisions, {True, False})
+
+    def test_logger_skips_sampled_records(self):
+        """Test the logger wrapper never creates records that are sampled out."""
+        logger = Mock(spec=logging.Logger)
+        logger.isEnabledFor.return_value = True
+        wrapper = Logger(logger, Logger.LoggerType.SERVER, LogSampler({logging.INFO: 0}))
+        wrapper.info("dropped")
+        wrapper.warning("kept")
+        logger.log.assert_called_once_with(logging.WARNING, "kept", extra={"log_type": "server"})
+
+    def test_failed_requests_are_kept(self):
+        """Test end lines of failed requests are kept when successful ones are sampled out."""
+        client = app.test_client()
+        sampler = LogSampler({logging.INFO: 0})
+        with patch.object(app.server_logger, "sampler", sampler), patch.object(
+            app.logger, "log"
+        ) as log:
+            client.post("/auth/login", json={}, headers={"X-Client-Version": "2.1.0"})
+            client.get("/metrics")
+        messages = [call.args for call in log.call_args_list]
+        self.assertIn((logging.WARNING, "POST /auth/login 400"), messages)
+        self.assertNotIn(logging.INFO, [level for level, _ in messages])
+
+
+class TestLogRotation(unittest.TestCase):
+    """Test size based log rotation with compression."""
+
+    def test_rotates_and_compresses(self):
+        """Test rotated segments are gzipped and only the newest are kept."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "test.log")
+        handler = CompressingRotatingFileHandler(path, maxBytes=100, backupCount=2, retention=2)
+        for i in range(10):
+            record = logging.LogRecord("test", logging.INFO, __file__, 1, f"{i:<60}", None, None)
+            handler.handle(record)
+        handler.close()
+        segments = sorted(glob.glob(f"{path}.*"))
+        self.assertEqual(segments, [f"{path}.1.gz", f"{path}.2.gz"])
+        with gzip.open(segments[0], "rt") as f:
+            self.assertEqual(f.read().split()[0], "8")
+
+    def test_failed_compression_does_not_stop_rotation(self):
+        """Test a compression error is reported once and later rollovers still rotate."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "test.log")
+        handler = CompressingRotatingFileHandler(path, maxBytes=100, backupCount=2, retention=2)
+        compress = handler._compress
+        with patch.object(handler, "_compress", side_effect=OSError("disk full")):
+            handler.doRollover()
+        handler._compress = compress
+        with patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            handler.doRollover()
+            handler.doRollover()
+        handler.close()
+        self.assertIn("disk full", stderr.getvalue())
+        self.assertEqual(stderr.getvalue().count("failed"), 1)
+        self.assertTrue(os.path.exists(f"{path}.1.gz"))
+
+    def test_retention_counts_uncompressed_segments(self):
+        """Test a segment left uncompressed by a failure is deleted once it's too old."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "test.log")
+        handler = CompressingRotatingFileHandler(path, maxBytes=100, backupCount=2, retention=2)
+        self.addCleanup(handler.close)
+        for i, segment in enumerate((f"{path}.3", f"{path}.2", f"{path}.1")):
+            with open(segment, "w") as f:
+                f.write("line\n")
+            os.utime(segment, (i, i))
+        with patch("gzip.open", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                handler._compress(f"{path}.2", f"{path}.2.gz")
+        self.assertEqual(sorted(glob.glob(f"{path}.*")), [f"{path}.1", f"{path}.2"])
+        handler._compress(f"{path}.1", f"{path}.1.gz")
+        self.assertEqual(sorted(glob.glob(f"{path}.*")), [f"{path}.1.gz", f"{path}.2"])
+
+    def test_external_rotation(self):
+        """Test "external" rotation reopens the file after logrotate moved it."""
+        config = Mock(LOG_ROTATION="external", LOG_FILE=os.devnull)
+        handler = create_file_handler(config)
+        self.addCleanup(handler.close)
+        self.assertIsInstance(handler, WatchedFileHandler)
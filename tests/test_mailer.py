@@ -0,0 +1,108 @@
+"""Unit tests for email delivery and batching."""
+
+import io
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import Mock, patch
+from app.core.mailer import EmailBatcher, SMTPMailer
+from tasks import send_emails
+from tests.smtp_server import SMTPServer
+
+
+MESSAGES = [(f"user{i}@test.com", "Password Reset", f"Code {i}") for i in range(3)]
+
+
+class TestSMTPMailer(unittest.TestCase):
+    """Test messages are sent over one reused connection."""
+
+    def test_batch_over_one_connection(self):
+        """Test batches share a connection, reopened when the server closed it."""
+        with SMTPServer() as server:
+            mailer = SMTPMailer("127.0.0.1", server.port, sender="noreply@test.com")
+            self.assertEqual(mailer.send(MESSAGES), [])
+            mailer.send(MESSAGES[:1])
+            self.assertEqual(server.connections, 1)
+
+            mailer._connection.close()  # Dropped, as by an idle timeout
+            mailer.send(MESSAGES[:1])
+            mailer.close()
+        self.assertEqual(server.connections, 2)
+        self.assertEqual(len(server.messages), 5)
+        message = server.messages[0]
+        self.assertEqual(message["To"], "user0@test.com")
+        self.assertEqual(message["From"], "noreply@test.com")
+        self.assertEqual(message.get_payload().strip(), "Code 0")
+
+    def test_rejected_message(self):
+        """Test a message the server rejects is reported and doesn't stop the others."""
+        with SMTPServer() as server:
+            server.rejected.add("user1@test.com")
+            mailer = SMTPMailer("127.0.0.1", server.port)
+            self.assertEqual(mailer.send(MESSAGES), ["user1@test.com"])
+            mailer.close()
+        self.assertEqual(
+            [message["To"] for message in server.messages], ["user0@test.com", "user2@test.com"]
+        )
+
+    def test_print_without_host(self):
+        """Test messages are printed when no SMTP host is configured."""
+        output = io.StringIO()
+        with redirect_stdout(output):
+            SMTPMailer(None).send(MESSAGES[:1])
+        self.assertEqual(
+            output.getvalue(),
+            "Email sent to user0@test.com with subject: Password Reset and body: Code 0\n",
+        )
+
+    def test_send_emails_task(self):
+        """Test the batch task sends through the process' mailer."""
+        with SMTPServer() as server, patch("tasks.mailer", SMTPMailer("127.0.0.1", server.port)):
+            self.assertEqual(send_emails(MESSAGES), 3)
+        self.assertEqual(server.connections, 1)
+
+
+class TestEmailBatcher(unittest.TestCase):
+    """Test messages are coalesced by size and by time window."""
+
+    def test_full_batch(self):
+        """Test a full batch is sent right away."""
+        send_batch = Mock()
+        batcher = EmailBatcher(send_batch, max_size=2, window=60)
+        batcher.add(MESSAGES[0])
+        send_batch.assert_not_called()
+        batcher.add(MESSAGES[1])
+        send_batch.assert_called_once_with(MESSAGES[:2])
+        self.assertIsNone(batcher._timer)
+
+    def test_window(self):
+        """Test a partial batch is sent when the window of its first message ends."""
+        sent = threading.Event()
+        send_batch = Mock(side_effect=lambda batch: sent.set())
+        batcher = EmailBatcher(send_batch, max_size=100, window=0.05)
+        batcher.add(MESSAGES[0])
+        batcher.add(MESSAGES[1])
+        self.assertTrue(sent.wait(5))
+        send_batch.assert_called_once_with(MESSAGES[:2])
+
+    def test_failed_batch(self):
+        """Test a batch that couldn't be sent is logged as lost and counted."""
+        logger = Mock()
+        batcher = EmailBatcher(
+            Mock(side_effect=ConnectionError("Broker down")), max_size=2, window=60, logger=logger
+        )
+        batcher.add(MESSAGES[0])
+        batcher.add(MESSAGES[1])
+        self.assertEqual(batcher.failures, 1)
+        logger.error.assert_called_once_with(
+            "Sending a batch of 2 failed, it was lost: Broker down"
+        )
+
+    def test_flush(self):
+        """Test flushing sends what's pending, and nothing when empty."""
+        send_batch = Mock()
+        batcher = EmailBatcher(send_batch, max_size=100, window=60)
+        batcher.flush()
+        batcher.add(MESSAGES[0])
+        batcher.flush()
+        send_batch.assert_called_once_with(MESSAGES[:1])
@@ -0,0 +1,110 @@
+"""Unit tests for the metrics registry and the `/metrics` endpoint."""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.server import app
+from app.core import timing
+from app.core.config import CONFIG
+from app.core.metrics import MetricsRegistry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test metrics are recorded, merged across workers and rendered."""
+
+    def test_render(self):
+        """Test counters, gauges and cumulative histogram buckets in the text format."""
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        registry.inc("requests_total", endpoint="/a", status=200)
+        registry.inc("requests_total", endpoint="/a", status=200)
+        registry.add("in_flight", 1)
+        for value in (0.05, 0.5, 5):
+            registry.observe("duration_seconds", value, endpoint="/a")
+        registry.register_collector(lambda: [("counter", "hits_total", {"cache": "x"}, 3)])
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE requests_total counter", lines)
+        self.assertIn('requests_total{endpoint="/a",status="200"} 2', lines)
+        self.assertIn('hits_total{cache="x"} 3', lines)
+        self.assertIn("in_flight 1", lines)
+        self.assertIn('duration_seconds_bucket{endpoint="/a",le="0.1"} 1', lines)
+        self.assertIn('duration_seconds_bucket{endpoint="/a",le="1"} 2', lines)
+        self.assertIn('duration_seconds_bucket{endpoint="/a",le="+Inf"} 3', lines)
+        self.assertIn('duration_seconds_count{endpoint="/a"} 3', lines)
+        self.assertIn('duration_seconds_sum{endpoint="/a"} 5.55', lines)
+
+    def test_workers_are_merged(self):
+        """Test snapshots of other workers are added up, without gauges of exited ones."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        for pid in (os.getppid(), exited.pid):
+            worker = MetricsRegistry(directory=directory)
+            worker.inc("requests_total", endpoint="/a")
+            worker.add("in_flight", 1)
+            worker.observe("duration_seconds", 0.2)
+            with open(os.path.join(directory, f"{pid}.json"), "w") as f:
+                json.dump(worker.snapshot(), f)
+
+        registry = MetricsRegistry(directory=directory)
+        registry.inc("requests_total", endpoint="/a")
+        lines = registry.render().splitlines()
+        self.assertIn('requests_total{endpoint="/a"} 3', lines)
+        self.assertIn("in_flight 1", lines)
+        self.assertIn("duration_seconds_count 2", lines)
+
+        registry.flush()
+        self.assertTrue(os.path.exists(os.path.join(directory, f"{os.getpid()}.json")))
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test requests are recorded and exposed on `/metrics`."""
+
+    def test_metrics_endpoint(self):
+        """Test a request shows up by route, without requiring a client version."""
+        client = app.test_client()
+        client.post("/auth/login", json={}, headers={"X-Client-Version": "2.1.0"})
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        body = response.get_data(as_text=True)
+        self.assertIn(
+            'http_requests_total{endpoint="/auth/login",method="POST",status="400"}', body
+        )
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="/auth/login"', body)
+        # The scrape itself is in flight
+        self.assertIn("http_requests_in_flight 1", body)
+        self.assertIn('cache_hits_total{cache="token"}', body)
+        self.assertIn('email_batches_lost_total{batcher="reset"} 0', body)
+
+    def test_metrics_endpoint_access(self):
+        """Test scrapes need the token when one is set, or come from localhost otherwise."""
+        client = app.test_client()
+        remote = {"REMOTE_ADDR": "203.0.113.7"}
+        self.assertEqual(client.get("/metrics", environ_base=remote).status_code, 403)
+        with patch.object(CONFIG, "METRICS_TOKEN", "secret"):
+            self.assertEqual(client.get("/metrics").status_code, 403)
+            response = client.get(
+                "/metrics", headers={"Authorization": "Bearer secret"}, environ_base=remote
+            )
+            self.assertEqual(response.status_code, 200)
+
+
+class TestPhase(unittest.TestCase):
+    """Test phases are timed, and traced only when Sentry tracing is configured."""
+
+    def test_sentry_spans(self):
+        """Test a span is opened per phase only when tracing is on."""
+        with patch("sentry_sdk.start_span") as start_span:
+            with timing.phase("password"):
+                pass
+            start_span.assert_not_called()
+            with patch.object(timing, "SENTRY_TRACING", True), timing.phase("password"):
+                pass
+            start_span.assert_called_once_with(op="password")
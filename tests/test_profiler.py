@@ -0,0 +1,43 @@
+"""Unit tests for the request profiler."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.server import app
+from app.core.config import CONFIG
+from app.core.profiler import profile_report
+
+
+class TestProfiler(unittest.TestCase):
+    """Test requests are profiled on demand and profiles are aggregated."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        for name, value in (("PROFILER_ENABLED", True), ("PROFILER_DIR", self.directory)):
+            patcher = patch.object(CONFIG, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.app = app.test_client()
+
+    def test_profile_on_header(self):
+        """Test only requests sending the header are profiled, by request ID."""
+        self.app.post("/auth/login", json={})
+        self.assertEqual(os.listdir(self.directory), [])
+
+        self.app.post("/auth/login", json={}, headers={"X-Profile": "1"})
+        (profile,) = os.listdir(self.directory)
+        self.assertTrue(profile.endswith(".prof"))
+
+        report = profile_report(self.directory, top=5)
+        self.assertIn("1 profiles", report)
+        self.assertIn("function calls", report)
+
+    def test_disabled(self):
+        """Test nothing is profiled unless enabled, even with the header."""
+        with patch.object(CONFIG, "PROFILER_ENABLED", False):
+            self.app.post("/auth/login", json={}, headers={"X-Profile": "1"})
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(profile_report(self.directory), f"No profiles in {self.directory}.")
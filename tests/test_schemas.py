@@ -0,0 +1,25 @@
+"""Unit tests for the auth schemas."""
+
+import unittest
+from app.auth import schemas
+from app.sql_models import User
+
+
+class TestUserSerialization(unittest.TestCase):
+    """Test the fast path serializer matches the marshmallow schemas."""
+
+    def setUp(self):
+        self.user = User(customer_id="123", email="dummy@test.com", country="US", language="en")
+
+    def test_serialize_user(self):
+        """Test users and serialized users give the same output as `UserSchema`."""
+        expected = schemas.UserSchema().dump(self.user)
+        self.assertEqual(schemas.serialize_user(self.user), expected)
+        self.assertEqual(schemas.serialize_user(dict(expected, is_active=True)), expected)
+
+    def test_dump_user_response(self):
+        """Test the user response matches `UserResponse` with and without a JWT."""
+        for data in ({"user": self.user, "jwt": "token"}, {"user": self.user}, {"user": None}):
+            with self.subTest(data=data):
+                expected = schemas.UserResponse().dump({"data": data})
+                self.assertEqual(schemas.dump_user_response(**data), expected)
@@ -0,0 +1,52 @@
+"""Unit tests for the compiled request validators."""
+
+import unittest
+from marshmallow import ValidationError
+from app.auth import schemas
+from app.core.validation import compile_schema
+
+
+class TestCompiledSchema(unittest.TestCase):
+    """Test compiled validators load and fail exactly like `Schema.load`."""
+
+    PAYLOADS = [
+        {"email": "dummy@test.com", "password": "password"},
+        {"email": "dummy@test.com", "password": "password", "verification_code": "code"},
+        {"email": "invalid", "password": 1},
+        {"email": None},
+        {"language": "en"},
+        {"language": "invalid"},
+        {"language": 1, "country": "US"},
+        {},
+        [],
+        None,
+    ]
+
+    def _load(self, load, payload):
+        """Return loaded data or the validation error messages."""
+        try:
+            return load(payload)
+        except ValidationError as e:
+            return e.messages
+
+    def test_same_results_as_marshmallow(self):
+        """Test every request schema gives the same data and errors when compiled."""
+        for schema_class in (
+            schemas.LoginRequest,
+            schemas.ForgotPasswordRequest,
+            schemas.ResetPasswordRequest,
+            schemas.UpdateUserRequest,
+        ):
+            schema = schema_class()
+            load = compile_schema(schema)
+            self.assertIsNot(load, schema.load)
+            for payload in self.PAYLOADS:
+                with self.subTest(schema=schema_class.__name__, payload=payload):
+                    self.assertEqual(
+                        self._load(load, payload), self._load(schema.load, payload)
+                    )
+
+    def test_unsupported_schema_falls_back(self):
+        """Test schemas with unsupported fields keep using `Schema.load`."""
+        schema = schemas.UserResponse()
+        self.assertEqual(compile_schema(schema), schema.load)